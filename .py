@@ -1,5 +1,296 @@
 # catalog/models.py
-from django.db import models
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+class PriceCache:
+    """
+    Кэш цен товаров в памяти процесса: LRU на maxsize записей, версия на каждый товар
+    и общее поколение, которое сдвигает полный сброс. Цена, прочитанная из базы, попадает
+    в кэш, только если за время чтения не сбрасывались ни этот товар, ни кэш целиком —
+    в том числе товары, которых в кэше ещё не было.
+    При изменении товара (сигналы Товары, ТоварыQuerySet.update) кэш сбрасывается сразу
+    после записи и ещё раз после фиксации транзакции (invalidate_on_commit).
+    Цены, прочитанные внутри транзакции, сохраняются в кэш только после её фиксации
+    (transaction.on_commit) и с той же проверкой версий: незафиксированная цена,
+    в том числе откаченная, в кэше не остаётся.
+
+    Сброс действует только в текущем процессе: другие рабочие процессы (несколько
+    воркеров сервера, manage.py shell) о нём не узнают и продолжают отдавать закэшированную
+    цену, пока она не будет вытеснена или процесс не перезапустится. При нескольких
+    процессах, меняющих цены, кэш нужно сбрасывать в каждом из них.
+    """
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._prices = OrderedDict()
+        self._versions = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get_many(self, product_ids):
+        """Цены {id: цена}; отсутствующие в кэше читаются одним запросом. Неизвестные id пропускаются."""
+        prices, missing = {}, []
+        with self._lock:
+            for product_id in product_ids:
+                if product_id in self._prices:
+                    self._prices.move_to_end(product_id)
+                    prices[product_id] = self._prices[product_id]
+                    self.hits += 1
+                else:
+                    missing.append(product_id)
+                    self.misses += 1
+            generation = self._generation
+            versions = {product_id: self._versions.get(product_id, 0) for product_id in missing}
+        if missing:
+            loaded = dict(Товары.objects.filter(pk__in=missing).values_list("pk", "цена"))
+            prices.update(loaded)
+            if transaction.get_connection().in_atomic_block:
+                transaction.on_commit(lambda: self._store(loaded, generation, versions))
+            else:
+                self._store(loaded, generation, versions)
+        return prices
+
+    def _store(self, loaded, generation, versions):
+        """Кладёт прочитанные цены в кэш, если с момента чтения их не сбрасывали."""
+        with self._lock:
+            if self._generation != generation:
+                return
+            for product_id, price in loaded.items():
+                if self._versions.get(product_id, 0) == versions[product_id]:
+                    self._prices[product_id] = price
+            while len(self._prices) > self.maxsize:
+                self._prices.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, product_id):
+        prices = self.get_many([product_id])
+        if product_id not in prices:
+            raise Товары.DoesNotExist(f"Товар не найден: {product_id}")
+        return prices[product_id]
+
+    def invalidate(self, product_id=None):
+        """Сброс цены товара (или всего кэша при product_id=None)."""
+        with self._lock:
+            self.invalidations += 1
+            if product_id is None:
+                # Поколение отсекает чтения, начатые до сброса; версии товаров больше не нужны
+                self._generation += 1
+                self._versions.clear()
+                self._prices.clear()
+            else:
+                self._versions[product_id] = self._versions.get(product_id, 0) + 1
+                self._prices.pop(product_id, None)
+
+    def invalidate_on_commit(self, product_id=None):
+        """Сброс сейчас и повторно после фиксации текущей транзакции (вне транзакции — один раз)."""
+        self.invalidate(product_id)
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(lambda: self.invalidate(product_id))
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"size": len(self._prices), "hits": self.hits, "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "evictions": self.evictions, "invalidations": self.invalidations}
+
+price_cache = PriceCache()
+
+class ТоварыQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        updated = super().update(**kwargs)
+        # Массовое обновление не отправляет сигналы — сбрасываем кэш цен целиком
+        # после записи, а не до неё, иначе между сбросом и UPDATE в кэш вернётся старая цена
+        if "цена" in kwargs or "номер_товара" in kwargs:
+            price_cache.invalidate_on_commit()
+        return updated
+
+# Поля, от которых зависит сводка ДневныеПродажи
+SALE_ROLLUP_FIELDS = {"номер_чека", "номер_чека_id", "дата_покупки", "номер_кассы", "продавец"}
+RECEIPT_ROLLUP_FIELDS = {"товар", "товар_id", "количество", "стоимость"}
+
+def _update_with_rollup(queryset, kwargs, sale_filter):
+    """
+    Массовое обновление не отправляет сигналы, поэтому сводка пересчитывается здесь:
+    затронутые продажи читаются до и после записи, разница применяется к ДневныеПродажи
+    в той же транзакции. bulk_update обновляет строки через update и тоже сюда попадает.
+    """
+    with transaction.atomic(using=queryset.db):
+        pks = list(queryset.values_list("pk", flat=True))
+        sales = Продавцы.objects.using(queryset.db).select_related("номер_чека").filter(**{sale_filter: pks})
+        deltas = _sale_deltas(list(sales), sign=-1)
+        # Обновляются ровно прочитанные строки: фильтр queryset мог зависеть от изменяемых полей
+        updated = queryset.model._base_manager.using(queryset.db).filter(pk__in=pks).update(**kwargs)
+        ДневныеПродажи.objects.apply(_sale_deltas(sales.all(), deltas=deltas))
+    return updated
+
+class ЧекиQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        if RECEIPT_ROLLUP_FIELDS.isdisjoint(kwargs):
+            return super().update(**kwargs)
+        return _update_with_rollup(self, kwargs, "номер_чека_id__in")
+
+class ПродавцыQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        if SALE_ROLLUP_FIELDS.isdisjoint(kwargs):
+            return super().update(**kwargs)
+        return _update_with_rollup(self, kwargs, "pk__in")
+
+class ЧекиManager(models.Manager.from_queryset(ЧекиQuerySet)):
+    def bulk_ingest(self, rows, batch_size=1000):
+        """
+        Массовое добавление чеков без запроса цены на каждую строку.
+        rows — итерируемое словарей {"товар": id или Товары, "количество": int}.
+        Цены берутся из price_cache, недостающие читаются одним запросом; стоимость считается
+        в Python, вставка идёт через bulk_create пакетами в одной транзакции.
+        Возвращает список созданных чеков.
+        """
+        rows = list(rows)
+        product_ids = {getattr(row["товар"], "pk", row["товар"]) for row in rows}
+        prices = price_cache.get_many(product_ids)
+        missing = product_ids - prices.keys()
+        if missing:
+            raise Товары.DoesNotExist(f"Товары не найдены: {sorted(missing)}")
+        receipts = []
+        for row in rows:
+            product_id = getattr(row["товар"], "pk", row["товар"])
+            receipts.append(Чеки(товар_id=product_id, количество=row["количество"],
+                                 стоимость=prices[product_id] * row["количество"]))
+        with transaction.atomic():
+            return self.bulk_create(receipts, batch_size=batch_size)
+
+class ПродавцыManager(models.Manager.from_queryset(ПродавцыQuerySet)):
+    def bulk_ingest(self, sales, batch_size=1000):
+        """
+        Массовая регистрация продаж: для каждой записи создается чек
+        (см. ЧекиManager.bulk_ingest) и строка продавца, всё в одной транзакции.
+        sales — словари {"товар", "количество", "дата_покупки", "номер_кассы", "продавец"}.
+        """
+        sales = list(sales)
+        with transaction.atomic():
+            receipts = Чеки.objects.bulk_ingest(sales, batch_size=batch_size)
+            sellers = [Продавцы(номер_чека=receipt, дата_покупки=sale["дата_покупки"],
+                                номер_кассы=sale["номер_кассы"], продавец=sale["продавец"])
+                       for receipt, sale in zip(receipts, sales)]
+            sellers = self.bulk_create(sellers, batch_size=batch_size)
+            # bulk_create не отправляет сигналы — сводка обновляется одним пакетом
+            ДневныеПродажи.objects.apply(_sale_deltas(sellers))
+            return sellers
+
+    def filtered(self, продавец=None, номер_кассы=None, дата_с=None, дата_по=None):
+        """Продажи с чеком и товаром (один запрос с JOIN), новые сначала."""
+        queryset = self.select_related("номер_чека__товар").order_by("-дата_покупки", "-id")
+        if продавец:
+            queryset = queryset.filter(продавец=продавец)
+        if номер_кассы is not None:
+            queryset = queryset.filter(номер_кассы=номер_кассы)
+        if дата_с:
+            queryset = queryset.filter(дата_покупки__gte=дата_с)
+        if дата_по:
+            queryset = queryset.filter(дата_покупки__lte=дата_по)
+        return queryset
+
+    def page(self, cursor=None, limit=50, **filters):
+        """
+        Страница продаж по ключу (дата_покупки, id) вместо OFFSET: cursor — значение
+        next_cursor предыдущей страницы. Возвращает (список продаж, next_cursor или None).
+        Неверный cursor — ValueError.
+        """
+        queryset = self.filtered(**filters)
+        if cursor:
+            try:
+                day, last_id = cursor.split(":")
+                day, last_id = date.fromisoformat(day), int(last_id)
+            except ValueError:
+                raise ValueError(f"Неверный cursor: {cursor}")
+            queryset = queryset.filter(Q(дата_покупки__lt=day) | Q(дата_покупки=day, id__lt=last_id))
+        sales = list(queryset[:limit + 1])
+        next_cursor = None
+        if len(sales) > limit:
+            sales = sales[:limit]
+            next_cursor = f"{sales[-1].дата_покупки.isoformat()}:{sales[-1].id}"
+        return sales, next_cursor
+
+    def export_rows(self, chunk_size=2000, **filters):
+        """Потоковый обход продаж для выгрузки: строки читаются порциями через iterator()."""
+        for sale in self.filtered(**filters).iterator(chunk_size=chunk_size):
+            yield sale.as_dict()
+
+class ДневныеПродажиManager(models.Manager):
+    """
+    Запросы для отчётов по продажам. Прошедшие дни берутся из ДневныеПродажи,
+    текущий день считается по Продавцы → Чеки на лету.
+    """
+    def apply(self, deltas):
+        """
+        Прибавляет к сводке дельты {(дата, продавец, касса, товар_id): [количество, выручка, чеков]}.
+        Новая строка сводки создается только для положительной дельты: вычитать из
+        отсутствующей строки нечего (например, её уже удалило каскадное удаление товара).
+        """
+        with transaction.atomic():
+            for (day, seller, register, product_id), (quantity, revenue, receipts) in deltas.items():
+                updated = self.filter(дата=day, продавец=seller, номер_кассы=register, товар_id=product_id).update(
+                    количество=F("количество") + quantity, выручка=F("выручка") + revenue,
+                    число_чеков=F("число_чеков") + receipts)
+                if not updated and receipts > 0:
+                    self.create(дата=day, продавец=seller, номер_кассы=register, товар_id=product_id,
+                                количество=quantity, выручка=revenue, число_чеков=receipts)
+                elif receipts < 0:
+                    # Строки сводки без продаж не храним
+                    self.filter(дата=day, продавец=seller, номер_кассы=register, товар_id=product_id,
+                                число_чеков__lte=0).delete()
+
+    def rebuild(self, start, end):
+        """Пересчёт сводки за период [start, end] по исходным данным."""
+        with transaction.atomic():
+            self.filter(дата__range=(start, end)).delete()
+            self.bulk_create(ДневныеПродажи(
+                дата=row["дата_покупки"], продавец=row["продавец"], номер_кассы=row["номер_кассы"],
+                товар_id=row["номер_чека__товар"], количество=row["количество"] or 0,
+                выручка=row["выручка"] or 0, число_чеков=row["число_чеков"])
+                for row in _live_sales(start, end, ("дата_покупки", "продавец", "номер_кассы", "номер_чека__товар")))
+
+    def summary(self, start, end, group_by):
+        """
+        Продажи за период [start, end], сгруппированные по group_by —
+        набору из "дата", "продавец", "номер_кассы", "товар".
+        Возвращает список словарей с полями группировки, количество, выручка, число_чеков.
+        """
+        today = date.today()
+        totals = {}
+        if start < today:
+            rows = (self.filter(дата__range=(start, min(end, today - timedelta(days=1))))
+                    .values(*group_by).annotate(кол=Sum("количество"), выр=Sum("выручка"), чеков=Sum("число_чеков")))
+            for row in rows:
+                key = tuple(row[field] for field in group_by)
+                totals[key] = [row["кол"], row["выр"], row["чеков"]]
+        if start <= today <= end:
+            live_fields = tuple(LIVE_FIELDS[field] for field in group_by)
+            for row in _live_sales(today, today, live_fields):
+                key = tuple(row[field] for field in live_fields)
+                current = totals.setdefault(key, [0, 0, 0])
+                current[0] += row["количество"] or 0
+                current[1] += row["выручка"] or 0
+                current[2] += row["число_чеков"]
+        return [dict(zip(group_by, key), количество=values[0], выручка=values[1], число_чеков=values[2])
+                for key, values in totals.items()]
+
+    def by_seller(self, start, end):
+        return self.summary(start, end, ("продавец",))
+
+    def by_register(self, start, end):
+        return self.summary(start, end, ("номер_кассы",))
+
+    def by_day(self, start, end):
+        return sorted(self.summary(start, end, ("дата",)), key=lambda row: row["дата"])
+
+    def top_products(self, start, end, limit=10):
+        return sorted(self.summary(start, end, ("товар",)), key=lambda row: -row["выручка"])[:limit]
 
 class Товары(models.Model):
     номер_товара = models.AutoField(primary_key=True)
@@ -7,6 +298,8 @@ class Товары(models.Model):
     единица_измерения = models.CharField(max_length=255)
     цена = models.IntegerField()
 
+    objects = ТоварыQuerySet.as_manager()
+
     def __str__(self):
         return self.наименование
 
@@ -16,8 +309,10 @@ class Чеки(models.Model):
     количество = models.IntegerField()
     стоимость = models.IntegerField(blank=True, null=True)
 
+    objects = ЧекиManager()
+
     def save(self, *args, **kwargs):
-        self.стоимость = self.товар.цена * self.количество
+        self.стоимость = price_cache.get(self.товар_id) * self.количество
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -30,5 +325,167 @@ class Продавцы(models.Model):
     продавец = models.CharField(max_length=255)
     id = models.AutoField(primary_key=True)
 
+    objects = ПродавцыManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-дата_покупки", "-id"], name="продавцы_дата_id"),
+            models.Index(fields=["продавец", "-дата_покупки"], name="продавцы_продавец_дата"),
+            models.Index(fields=["номер_кассы", "-дата_покупки"], name="продавцы_касса_дата"),
+        ]
+
+    def as_dict(self):
+        receipt = self.номер_чека
+        return {
+            "id": self.id,
+            "дата_покупки": self.дата_покупки.isoformat(),
+            "номер_кассы": self.номер_кассы,
+            "продавец": self.продавец,
+            "номер_чека": receipt.номер_чека,
+            "товар": receipt.товар.наименование,
+            "количество": receipt.количество,
+            "стоимость": receipt.стоимость,
+        }
+
+    def __str__(self):
+        return str(self.id)
+
+class ДневныеПродажи(models.Model):
+    """Сводка продаж за день по продавцу, кассе и товару; поддерживается сигналами."""
+    дата = models.DateField()
+    продавец = models.CharField(max_length=255)
+    номер_кассы = models.IntegerField()
+    товар = models.ForeignKey(Товары, on_delete=models.CASCADE)
+    количество = models.IntegerField(default=0)
+    выручка = models.IntegerField(default=0)
+    число_чеков = models.IntegerField(default=0)
+
+    objects = ДневныеПродажиManager()
+
+    class Meta:
+        unique_together = ("дата", "продавец", "номер_кассы", "товар")
+
     def __str__(self):
-        return str(self.id)
\ No newline at end of file
+        return f"{self.дата} {self.продавец} {self.номер_кассы} {self.товар_id}"
+
+# Соответствие полей сводки полям запроса по исходным данным
+LIVE_FIELDS = {"дата": "дата_покупки", "продавец": "продавец", "номер_кассы": "номер_кассы",
+               "товар": "номер_чека__товар"}
+
+def _live_sales(start, end, fields):
+    return (Продавцы.objects.filter(дата_покупки__range=(start, end)).values(*fields)
+            .annotate(количество=Sum("номер_чека__количество"), выручка=Sum("номер_чека__стоимость"),
+                      число_чеков=Count("id")))
+
+def _sale_deltas(sellers, sign=1, deltas=None):
+    """Дельты сводки для строк Продавцы (с подгруженными чеками)."""
+    deltas = {} if deltas is None else deltas
+    for seller in sellers:
+        receipt = seller.номер_чека
+        day = models.DateField().to_python(seller.дата_покупки)
+        current = deltas.setdefault((day, seller.продавец, seller.номер_кассы, receipt.товар_id), [0, 0, 0])
+        current[0] += sign * receipt.количество
+        current[1] += sign * (receipt.стоимость or 0)
+        current[2] += sign
+    return deltas
+
+@receiver(post_save, sender=Товары)
+@receiver(post_delete, sender=Товары)
+def _invalidate_price(sender, instance, **kwargs):
+    price_cache.invalidate_on_commit(instance.pk)
+
+# Товары, удаляемые в текущем потоке: их строки сводки удаляются каскадом,
+# поэтому продажи, удаляемые вместе с ними, сводку не меняют
+_deleting_products = threading.local()
+
+@receiver(pre_delete, sender=Товары)
+def _remember_deleted_product(sender, instance, **kwargs):
+    if not hasattr(_deleting_products, "ids"):
+        _deleting_products.ids = set()
+    _deleting_products.ids.add(instance.pk)
+
+@receiver(post_delete, sender=Товары)
+def _forget_deleted_product(sender, instance, **kwargs):
+    getattr(_deleting_products, "ids", set()).discard(instance.pk)
+
+@receiver(pre_save, sender=Продавцы)
+def _remember_old_sale(sender, instance, **kwargs):
+    instance._rollup_old = None
+    if instance.pk is not None:
+        instance._rollup_old = (Продавцы.objects.select_related("номер_чека")
+                                .filter(pk=instance.pk).first())
+
+@receiver(post_save, sender=Продавцы)
+def _rollup_sale_saved(sender, instance, **kwargs):
+    deltas = _sale_deltas([instance])
+    if getattr(instance, "_rollup_old", None) is not None:
+        _sale_deltas([instance._rollup_old], sign=-1, deltas=deltas)
+    ДневныеПродажи.objects.apply(deltas)
+
+@receiver(post_delete, sender=Продавцы)
+def _rollup_sale_deleted(sender, instance, **kwargs):
+    if instance.номер_чека.товар_id in getattr(_deleting_products, "ids", ()):
+        return
+    ДневныеПродажи.objects.apply(_sale_deltas([instance], sign=-1))
+
+@receiver(pre_save, sender=Чеки)
+def _remember_old_receipt(sender, instance, **kwargs):
+    instance._rollup_sellers = []
+    if instance.pk is not None:
+        # Изменение чека меняет сводку для всех связанных продаж
+        instance._rollup_sellers = list(Продавцы.objects.select_related("номер_чека")
+                                        .filter(номер_чека_id=instance.pk))
+
+@receiver(post_save, sender=Чеки)
+def _rollup_receipt_saved(sender, instance, **kwargs):
+    old_sellers = getattr(instance, "_rollup_sellers", [])
+    if old_sellers:
+        deltas = _sale_deltas(old_sellers, sign=-1)
+        for seller in old_sellers:
+            seller.номер_чека = instance
+        ДневныеПродажи.objects.apply(_sale_deltas(old_sellers, deltas=deltas))
+
+def benchmark_ingest(count=1000, products=50):
+    """
+    Сравнение текущего пути (save() для каждой строки) и bulk_ingest.
+    Цены, прочитанные внутри транзакции, в кэш не попадают до её фиксации,
+    поэтому путь save() по-прежнему читает цену товара запросом на каждую строку.
+    Запуск: python manage.py shell -c "from catalog.models import benchmark_ingest; print(benchmark_ingest())"
+    В конце удаляется товар с продажами (каскад на чеки, продажи и сводку).
+    Тестовые данные удаляются откатом транзакции. Возвращает {путь: (секунды, число запросов)}.
+    """
+    import random
+    import time
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    results = {}
+    with transaction.atomic():
+        items = Товары.objects.bulk_create(
+            Товары(наименование=f"Товар {i}", единица_измерения="шт", цена=random.randint(1, 1000))
+            for i in range(products))
+        sales = [{"товар": random.choice(items).pk, "количество": random.randint(1, 10),
+                  "дата_покупки": date.today(), "номер_кассы": random.randint(1, 5), "продавец": "Бенчмарк"}
+                 for _ in range(count)]
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for sale in sales:
+                receipt = Чеки(товар_id=sale["товар"], количество=sale["количество"])
+                receipt.save()
+                Продавцы.objects.create(номер_чека=receipt, дата_покупки=sale["дата_покупки"],
+                                        номер_кассы=sale["номер_кассы"], продавец=sale["продавец"])
+            results["save"] = (time.perf_counter() - started, len(queries))
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            Продавцы.objects.bulk_ingest(sales)
+            results["bulk_ingest"] = (time.perf_counter() - started, len(queries))
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            product = items[0]
+            product.delete()
+            results["delete_product"] = (time.perf_counter() - started, len(queries))
+        transaction.set_rollback(True)
+    return results
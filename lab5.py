@@ -3,6 +3,8 @@ from tkinter import ttk, messagebox
 import sqlite3
 import re
 import hashlib
+import time
+from datetime import date
 from tkcalendar import DateEntry  # Импорт виджета календаря
 
 class DatabaseApp:
@@ -22,6 +24,11 @@ class DatabaseApp:
         self.conn = sqlite3.connect(**connection_params)
         self.cursor = self.conn.cursor()
 
+        # Формы добавления/изменения и метаданные столбцов создаются один раз
+        self.columns_cache = {}
+        self.row_forms = {}
+        self.dialog_timings = {}
+
         # Получаем имена таблиц
         self.table_names = self.get_table_names()
 
@@ -132,40 +139,92 @@ class DatabaseApp:
             # Поле "Дата" предполагается в формате, выбранном через DateEntry (например, dd.mm.yyyy)
         return new_values
 
-    def add_row(self, tree, table_name):
-        self.cursor.execute(f"PRAGMA table_info('{table_name}');")
-        columns = [row[1] for row in self.cursor.fetchall()]
-
-        add_dialog = tk.Toplevel(self.master)
-        add_dialog.title("Добавить строку")
+    def get_columns(self, table_name):
+        """Имена столбцов таблицы (кэшируются)."""
+        if table_name not in self.columns_cache:
+            self.cursor.execute(f"PRAGMA table_info('{table_name}');")
+            self.columns_cache[table_name] = [row[1] for row in self.cursor.fetchall()]
+        return self.columns_cache[table_name]
+
+    def get_row_form(self, table_name):
+        """
+        Форма добавления/изменения строки создается один раз для таблицы,
+        затем скрывается (withdraw) и показывается снова вместо пересоздания.
+        """
+        if table_name in self.row_forms:
+            return self.row_forms[table_name]
+        columns = self.get_columns(table_name)
+        dialog = tk.Toplevel(self.master)
+        dialog.withdraw()
+        dialog.protocol("WM_DELETE_WINDOW", dialog.withdraw)
 
         entry_widgets = []
         # Используем enumerate для корректного размещения виджетов
         for index, col in enumerate(columns):
-            label = tk.Label(add_dialog, text=col)
+            label = tk.Label(dialog, text=col)
             label.grid(row=index, column=0, padx=10, pady=5, sticky='e')
             # Для таблицы "Заказы" создаем специальные виджеты для "Пользователь_id" и "Дата"
             if table_name == "Заказы" and col == "Пользователь_id":
+                widget = ttk.Combobox(dialog, state="readonly")
+            elif table_name == "Заказы" and col == "Дата":
+                widget = DateEntry(dialog, date_pattern='dd.mm.yyyy')
+            else:
+                widget = tk.Entry(dialog)
+            widget.grid(row=index, column=1, padx=10, pady=5, sticky='w')
+            entry_widgets.append(widget)
+
+        form = {"dialog": dialog, "columns": columns, "widgets": entry_widgets, "on_submit": None}
+        submit_button = tk.Button(dialog, text="Подтвердить", command=lambda: form["on_submit"]())
+        submit_button.grid(row=len(columns), columnspan=2, pady=10)
+        self.row_forms[table_name] = form
+        return form
+
+    def show_row_form(self, table_name, title, values, on_submit):
+        """
+        Заполнение и показ формы; values=None — пустая форма для добавления.
+        Уже открытая форма только поднимается, чтобы не потерять несохранённый ввод.
+        """
+        started = time.perf_counter()
+        form = self.get_row_form(table_name)
+        if form["dialog"].state() != "withdrawn":
+            form["dialog"].deiconify()
+            form["dialog"].lift()
+            return form
+        form["on_submit"] = on_submit
+        for index, widget in enumerate(form["widgets"]):
+            value = values[index] if values is not None else None
+            if isinstance(widget, ttk.Combobox):
                 self.cursor.execute("SELECT id, Имя FROM 'Пользователи';")
                 users = self.cursor.fetchall()
-                user_values = [f"{user[0]}: {user[1]}" for user in users]
-                combobox = ttk.Combobox(add_dialog, state="readonly")
-                combobox['values'] = user_values
-                combobox.grid(row=index, column=1, padx=10, pady=5, sticky='w')
-                entry_widgets.append(combobox)
-            elif table_name == "Заказы" and col == "Дата":
-                date_entry = DateEntry(add_dialog, date_pattern='dd.mm.yyyy')
-                date_entry.grid(row=index, column=1, padx=10, pady=5, sticky='w')
-                entry_widgets.append(date_entry)
+                widget['values'] = [f"{user[0]}: {user[1]}" for user in users]
+                widget.set("")
+                if value is not None:
+                    # Пытаемся установить текущее значение (если в базе хранится только id)
+                    try:
+                        self.cursor.execute("SELECT Имя FROM 'Пользователи' WHERE id = ?;", (value,))
+                        user_name = self.cursor.fetchone()[0]
+                        widget.set(f"{value}: {user_name}")
+                    except Exception:
+                        widget.set(str(value))
+            elif isinstance(widget, DateEntry):
+                widget.set_date(value if value is not None else date.today())
             else:
-                entry = tk.Entry(add_dialog)
-                entry.grid(row=index, column=1, padx=10, pady=5, sticky='w')
-                entry_widgets.append(entry)
+                widget.delete(0, tk.END)
+                if value is not None:
+                    widget.insert(0, value)
+        dialog = form["dialog"]
+        dialog.title(title)
+        dialog.deiconify()
+        dialog.lift()
+        dialog.after_idle(lambda: self.dialog_timings.setdefault(table_name, []).append(
+            time.perf_counter() - started))
+        return form
 
+    def add_row(self, tree, table_name):
         def insert_row():
             # Получаем значения из виджетов. Для виджетов типа DateEntry и Combobox метод get() работает аналогично.
-            values = [widget.get() for widget in entry_widgets]
-            validated_values = self.validate_and_transform(table_name, columns, values)
+            values = [widget.get() for widget in form["widgets"]]
+            validated_values = self.validate_and_transform(table_name, form["columns"], values)
             if validated_values is None:
                 return
             placeholders = ', '.join(['?' for _ in validated_values])
@@ -173,10 +232,9 @@ class DatabaseApp:
             self.cursor.execute(query, validated_values)
             self.conn.commit()
             self.populate_treeview(tree, table_name)
-            add_dialog.destroy()
+            form["dialog"].withdraw()
 
-        submit_button = tk.Button(add_dialog, text="Подтвердить", command=insert_row)
-        submit_button.grid(row=len(columns), columnspan=2, pady=10)
+        form = self.show_row_form(table_name, "Добавить строку", None, insert_row)
 
     def delete_row(self, tree, table_name):
         selected_item = tree.selection()
@@ -200,44 +258,10 @@ class DatabaseApp:
             return
 
         values = tree.item(selected_item)['values']
-        self.cursor.execute(f"PRAGMA table_info('{table_name}');")
-        columns = [row[1] for row in self.cursor.fetchall()]
-
-        edit_dialog = tk.Toplevel(self.master)
-        edit_dialog.title("Изменить строку")
-
-        entry_widgets = []
-        for index, (col, value) in enumerate(zip(columns, values)):
-            label = tk.Label(edit_dialog, text=col)
-            label.grid(row=index, column=0, padx=10, pady=5, sticky='e')
-            if table_name == "Заказы" and col == "Пользователь_id":
-                self.cursor.execute("SELECT id, Имя FROM 'Пользователи';")
-                users = self.cursor.fetchall()
-                user_values = [f"{user[0]}: {user[1]}" for user in users]
-                combobox = ttk.Combobox(edit_dialog, state="readonly")
-                combobox['values'] = user_values
-                # Пытаемся установить текущее значение (если в базе хранится только id)
-                try:
-                    self.cursor.execute("SELECT Имя FROM 'Пользователи' WHERE id = ?;", (value,))
-                    user_name = self.cursor.fetchone()[0]
-                    combobox.set(f"{value}: {user_name}")
-                except Exception:
-                    combobox.set(str(value))
-                combobox.grid(row=index, column=1, padx=10, pady=5, sticky='w')
-                entry_widgets.append(combobox)
-            elif table_name == "Заказы" and col == "Дата":
-                date_entry = DateEntry(edit_dialog, date_pattern='dd.mm.yyyy')
-                date_entry.set_date(value)
-                date_entry.grid(row=index, column=1, padx=10, pady=5, sticky='w')
-                entry_widgets.append(date_entry)
-            else:
-                entry = tk.Entry(edit_dialog)
-                entry.insert(0, value)
-                entry.grid(row=index, column=1, padx=10, pady=5, sticky='w')
-                entry_widgets.append(entry)
 
         def update_row():
-            new_values = [widget.get() for widget in entry_widgets]
+            columns = form["columns"]
+            new_values = [widget.get() for widget in form["widgets"]]
             validated_values = self.validate_and_transform(table_name, columns, new_values)
             if validated_values is None:
                 return
@@ -247,10 +271,9 @@ class DatabaseApp:
             self.cursor.execute(query, validated_values + values)
             self.conn.commit()
             self.populate_treeview(tree, table_name)
-            edit_dialog.destroy()
+            form["dialog"].withdraw()
 
-        submit_button = tk.Button(edit_dialog, text="Подтвердить", command=update_row)
-        submit_button.grid(row=len(columns), columnspan=2, pady=10)
+        form = self.show_row_form(table_name, "Изменить строку", values, update_row)
 
     def generate_report(self):
         report_window = tk.Toplevel(self.master)
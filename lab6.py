@@ -3,65 +3,2654 @@ from tkinter import ttk, messagebox
 import sqlite3
 import re
 import hashlib
+import csv
+import gzip
+import json
+import heapq
+import itertools
+import difflib
+import math
+import os
+import queue
+import shutil
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from tkcalendar import DateEntry
 
-class DatabaseManager:
+PAGE_SIZE = 500
+SORT_INDEX_THRESHOLD = 3
+QUERY_CACHE_SIZE = 20
+QUERY_CACHE_MAX_ROWS = 10000
+
+# Таблицы со ссылкой Гражданин_id (строки, зависимые от гражданина)
+# и столбцы дат, для которых в формах используется DateEntry
+DEPENDENT_TABLES = ("Призывники", "Документы", "Отсрочки")
+DATE_COLUMNS = {
+    "Граждане": ("Дата_рождения",),
+    "Призывники": ("Дата_призыва",),
+    "Документы": ("Дата_выдачи",),
+    "Отсрочки": ("Дата_выдачи", "Срок_действия"),
+}
+
+class StorageBackend(ABC):
+    """
+    Интерфейс хранилища, через который DatabaseApp работает с данными.
+    Абстрактные методы обязательны: неполная реализация не создаётся (TypeError).
+
+    Интроспекция: get_table_names (пользовательские таблицы по алфавиту, без служебных),
+    get_columns, get_primary_key.
+    Чтение: fetchall, fetchone, fetch_page (постранично по ключу), iterate (потоково).
+    Запись: execute, insert_rows (пакетами), update_row, delete_row.
+    Транзакции: transaction() — контекст, фиксирующий изменения при успешном выходе.
+
+    Запросы пишутся с параметрами «?» и идентификаторами в двойных кавычках;
+    реализация сама приводит их к своему диалекту. Эталонная реализация —
+    DatabaseManager (SQLite), клиент-серверная — ServerBackend.
+    """
+    dialect = "sqlite"
+    Error = sqlite3.Error
+
+    def __init__(self):
+        self.sort_counts = {}
+
+    @abstractmethod
+    def get_table_names(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_columns(self, table_name):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_primary_key(self, table_name):
+        """Имя столбца первичного ключа или None, если ключ не из одного столбца."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def page_key(self, table_name):
+        """Уникальный столбец, которым дополняется ключ постраничной выборки."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def text_columns(self, table_name):
+        """
+        Столбцы, значения которых сравниваются как текст: числа из фильтров и из Treeview
+        (он превращает «2020» в 2020) передаются для них строкой. PostgreSQL не сравнивает
+        text с integer, а SQLite и так приводит число к тексту по сродству столбца.
+        """
+        raise NotImplementedError
+
+    def nulls_order(self, desc):
+        """Явный порядок NULL в ORDER BY, если он в диалекте не совпадает с SQLite."""
+        return ""
+
+    def like_operand(self, column):
+        """Левая часть фильтра LIKE для столбца: в SQLite LIKE работает со столбцом любого типа."""
+        return f'"{column}"'
+
+    @abstractmethod
+    def execute(self, query, params=()):
+        raise NotImplementedError
+
+    @abstractmethod
+    def fetchall(self, query, params=()):
+        raise NotImplementedError
+
+    @abstractmethod
+    def fetchone(self, query, params=()):
+        raise NotImplementedError
+
+    @abstractmethod
+    def iterate(self, query, params=(), chunk_size=1000):
+        raise NotImplementedError
+
+    @abstractmethod
+    def transaction(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def close(self):
+        raise NotImplementedError
+
+    def build_filter(self, filters, table_name):
+        """
+        Параметризованное условие WHERE из фильтров {столбец: текст}.
+        Текст вида ">10", "<=2020", "=Годен" сравнивается оператором (число — только
+        для столбцов не из text_columns), иначе ищется вхождение подстроки (LIKE).
+        """
+        text_columns = self.text_columns(table_name)
+        clauses, params = [], []
+        for col, text in filters.items():
+            text = text.strip()
+            if not text:
+                continue
+            match = re.match(r'^(>=|<=|<>|!=|>|<|=)\s*(.*)$', text)
+            if match:
+                op, value = match.groups()
+                try:
+                    value = int(value)
+                except ValueError:
+                    try:
+                        value = float(value)
+                    except ValueError:
+                        pass
+                if col in text_columns:
+                    value = match.group(2)
+                clauses.append(f'"{col}" {op} ?')
+                params.append(value)
+            else:
+                clauses.append(f"{self.like_operand(col)} LIKE ?")
+                params.append(f"%{text}%")
+        return clauses, params
+
+    def page_query(self, table_name, sort=None, desc=False, filters=None, after=None, limit=PAGE_SIZE):
+        """
+        Запрос страницы для fetch_page: первые два столбца результата — ключ
+        (значение столбца сортировки, page_key), далее строка таблицы.
+        Возвращает (запрос, параметры).
+        """
+        clauses, params = self.build_filter(filters or {}, table_name)
+        key = self.page_key(table_name)
+        sort_expr = f'"{sort}"' if sort else key
+        direction = "DESC" if desc else "ASC"
+        if after is not None:
+            last_value, last_key = after
+            # NULL идёт первым при ASC и последним при DESC, поэтому сравнение кортежей дополняется
+            if last_value is None:
+                clauses.append(f"({sort_expr} IS NULL AND {key} {'<' if desc else '>'} ?)"
+                               + ("" if desc else f" OR {sort_expr} IS NOT NULL"))
+                params.append(last_key)
+            else:
+                clauses.append(f"(({sort_expr}, {key}) {'<' if desc else '>'} (?, ?)"
+                               + (f" OR {sort_expr} IS NULL)" if desc else ")"))
+                params.extend([last_value, last_key])
+        where = f" WHERE {' AND '.join(f'({c})' for c in clauses)}" if clauses else ""
+        query = (f'SELECT {sort_expr}, {key}, * FROM "{table_name}"{where} '
+                 f'ORDER BY {sort_expr} {direction}{self.nulls_order(desc)}, {key} {direction} LIMIT ?;')
+        return query, params + [limit]
+
+    def fetch_page(self, table_name, sort=None, desc=False, filters=None, after=None, limit=PAGE_SIZE):
+        """
+        Страница строк таблицы с сортировкой и фильтрацией на стороне базы.
+        Постраничная выборка по ключу (значение столбца сортировки, page_key):
+        after — ключ последней строки предыдущей страницы.
+        Возвращает список (ключ, строка).
+        """
+        rows = self.fetchall(*self.page_query(table_name, sort, desc, filters, after, limit))
+        return [((row[0], row[1]), row[2:]) for row in rows]
+
+    def ensure_sort_index(self, table_name, column):
+        """
+        Учитывает сортировку по столбцу и после SORT_INDEX_THRESHOLD сортировок
+        создает индекс, чтобы ORDER BY выполнялся по индексу.
+        """
+        key = (table_name, column)
+        self.sort_counts[key] = self.sort_counts.get(key, 0) + 1
+        if self.sort_counts[key] == SORT_INDEX_THRESHOLD:
+            self.execute(f'CREATE INDEX IF NOT EXISTS "_sort_{table_name}_{column}" ON "{table_name}" ("{column}");')
+
+    def insert_rows(self, table_name, columns, rows, batch_size=1000):
+        """
+        Пакетная вставка строк одной транзакцией, по batch_size строк за executemany.
+        При ошибке изменения откатываются, исключение передаётся вызывающему.
+        Возвращает количество вставленных строк.
+        """
+        column_list = ", ".join(f'"{col}"' for col in columns)
+        placeholders = ", ".join("?" for _ in columns)
+        query = f'INSERT INTO "{table_name}" ({column_list}) VALUES ({placeholders});'
+        rows = iter(rows)
+        count = 0
+        with self.transaction() as cursor:
+            for batch in iter(lambda: list(itertools.islice(rows, batch_size)), []):
+                cursor.executemany(query, batch)
+                count += len(batch)
+        return count
+
+    def insert_row(self, table_name, columns, values):
+        column_list = ", ".join(f'"{col}"' for col in columns)
+        placeholders = ", ".join("?" for _ in columns)
+        return self.execute(f'INSERT INTO "{table_name}" ({column_list}) VALUES ({placeholders});', values)
+
+    def bind_values(self, table_name, columns, values):
+        """Значения строки из интерфейса для параметров: числа в text_columns передаются строкой."""
+        text_columns = self.text_columns(table_name)
+        return [str(value) if col in text_columns and isinstance(value, (int, float)) else value
+                for col, value in zip(columns, values)]
+
+    def update_row(self, table_name, columns, new_values, old_values):
+        """Изменение строки, найденной по совпадению всех столбцов со старыми значениями."""
+        set_clause = ", ".join(f'"{col}" = ?' for col in columns)
+        where_clause = " AND ".join(f'"{col}" = ?' for col in columns)
+        return self.execute(f'UPDATE "{table_name}" SET {set_clause} WHERE {where_clause};',
+                            self.bind_values(table_name, columns, new_values)
+                            + self.bind_values(table_name, columns, old_values))
+
+    def delete_row(self, table_name, columns, values):
+        where_clause = " AND ".join(f'"{col}" = ?' for col in columns)
+        return self.execute(f'DELETE FROM "{table_name}" WHERE {where_clause};',
+                            self.bind_values(table_name, columns, values))
+
+    def count_rows(self, table_name):
+        return self.fetchone(f'SELECT COUNT(*) FROM "{table_name}";')[0]
+
+class DatabaseManager(StorageBackend):
+    """
+    Класс-обертка для работы с базой данных.
+    Инкапсулирует подключение, выполнение запросов и получение данных.
+    Эталонная реализация StorageBackend поверх файла SQLite.
+
+    При memory_replica=True база загружается в реплику :memory: через backup API,
+    а в файле устанавливается журнал изменений (install_cdc), если его ещё нет.
+    Запросы на чтение (SELECT/WITH) выполняются по реплике, запись — в файл.
+    Реплика обновляется, когда меняется PRAGMA data_version или после собственной
+    записи: по журналу _cdc_log, а если его часть уже удалена или изменилась схема
+    (PRAGMA schema_version) — полной перезагрузкой. Применённая часть журнала отмечается
+    водяным знаком в _cdc_consumers и удаляется, когда её применили все потребители.
+    Если реплика больше replica_limit_mb, чтение идёт с диска.
+
+    При archive_path подключается архив (см. Archiver) и для архивируемых таблиц
+    доступны представления <таблица>_с_архивом, объединяющие оперативные и архивные строки.
+
+    Шардированная раскладка — отдельная реализация StorageBackend (ShardedDatabase,
+    адрес shard:///каталог): после переноса данных командой shard create интерфейс
+    работает с шардами, а не с этим файлом.
+    """
+    def __init__(self, connection_params, memory_replica=False, replica_limit_mb=256, archive_path=None):
+        super().__init__()
+        self.connection_params = connection_params
+        self.location = connection_params.get("database")
+        self.conn = sqlite3.connect(**connection_params)
+        self.cursor = self.conn.cursor()
+        self.archive_path = archive_path
+        if archive_path:
+            attach_archive(self.conn, archive_path)
+        self.replica = None
+        self.replica_limit = replica_limit_mb * 1024 * 1024
+        self._replica_version = None
+        self._replica_seq = None
+        self._replica_schema = None
+        self._replica_stale = False
+        self.consumer = f"memory:{os.getpid()}:{id(self)}"
+        self.console_conn = None
+        self.query_cache = OrderedDict()
+        self._query_cache_version = None
+        if memory_replica:
+            # Без журнала каждая запись приводила бы к полной перезагрузке реплики
+            install_cdc(self.conn)
+            self.load_replica()
+
+    def database_size(self, conn=None):
+        conn = conn or self.conn
+        page_count = conn.execute("PRAGMA page_count;").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size;").fetchone()[0]
+        return page_count * page_size
+
+    def _data_version(self):
+        return self.conn.execute("PRAGMA data_version;").fetchone()[0]
+
+    def _set_replica_watermark(self):
+        """
+        Отмечает применённую репликой часть журнала и очищает журнал до наименьшего
+        водяного знака. Внутри открытой транзакции основного соединения не пишет,
+        чтобы не зафиксировать её раньше времени.
+        """
+        if self._replica_seq is None or self.conn.in_transaction:
+            return
+        try:
+            set_cdc_watermark(self.conn, self.consumer, self._replica_seq)
+            compact_cdc_log(self.conn)
+        except sqlite3.OperationalError:
+            # База занята другим писателем — водяной знак обновится при следующем чтении
+            self.conn.rollback()
+
+    def load_replica(self):
+        """Полная загрузка реплики в память. Возвращает False, если база не влезает в лимит."""
+        if self.replica is not None:
+            self.replica.close()
+            self.replica = None
+        if self.database_size() > self.replica_limit:
+            return False
+        replica = sqlite3.connect(":memory:")
+        self._replica_version = self._data_version()
+        self._replica_schema = schema_version(self.conn)
+        self._replica_seq = cdc_last_seq(self.conn)
+        self.conn.backup(replica)
+        # Изменения применяются к реплике готовыми строками из журнала, поэтому
+        # триггеры (_cdc_*, _due_* и пользовательские) в ней не нужны: иначе реплика
+        # вела бы собственный журнал, который никто не очищает
+        for (name,) in replica.execute("SELECT name FROM sqlite_master WHERE type='trigger';").fetchall():
+            replica.execute(f'DROP TRIGGER "{name}";')
+        if self._replica_seq is not None:
+            replica.execute(f'DELETE FROM "{CDC_LOG_TABLE}";')
+        replica.commit()
+        if self.database_size(replica) > self.replica_limit:
+            replica.close()
+            return False
+        if self.archive_path:
+            attach_archive(replica, self.archive_path)
+        self.replica = replica
+        self._replica_stale = False
+        self._set_replica_watermark()
+        return True
+
+    def refresh_replica(self):
+        """Инкрементальная синхронизация реплики с файлом."""
+        version = self._data_version()
+        if version == self._replica_version and not self._replica_stale:
+            return
+        if schema_version(self.conn) != self._replica_schema:
+            # Журнал не переносит DDL, а строки, записанные до пересоздания триггеров,
+            # в нём без новых столбцов — реплика загружается заново
+            if self._replica_seq is not None:
+                install_cdc(self.conn)
+            self.load_replica()
+            return
+        last_seq = cdc_last_seq(self.conn)
+        if self._replica_seq is None or last_seq is None:
+            self.load_replica()
+            return
+        changes = self.conn.execute(
+            f'SELECT seq, tbl, op, row_id, data FROM "{CDC_LOG_TABLE}" WHERE seq > ? ORDER BY seq;',
+            (self._replica_seq,)).fetchall()
+        expected = list(range(self._replica_seq + 1, last_seq + 1))
+        if [change[0] for change in changes] != expected:
+            # Часть журнала уже удалена (compact) — инкрементально не догнать
+            self.load_replica()
+            return
+        for seq, table, op, row_id, data in changes:
+            apply_change(self.replica, table, op, row_id, data)
+        self.replica.commit()
+        self._replica_seq = last_seq
+        self._replica_version = version
+        self._replica_stale = False
+        if changes:
+            self._set_replica_watermark()
+        if self.database_size(self.replica) > self.replica_limit:
+            self.replica.close()
+            self.replica = None
+
+    def _read_cursor(self, query):
+        """Курсор для запроса: реплика для чтения, если она включена, иначе файл."""
+        if self.replica is not None and query.lstrip().upper().startswith(("SELECT", "WITH")):
+            self.refresh_replica()
+            if self.replica is not None:
+                return self.replica.cursor()
+        return self.cursor
+
+    def get_table_names(self):
+        return sorted(get_user_tables(self.conn))
+
+    def get_columns(self, table_name):
+        return get_columns(self.conn, table_name)
+
+    def get_primary_key(self, table_name):
+        keys = [col[1] for col in self.conn.execute(f"PRAGMA table_info('{table_name}');") if col[5]]
+        return keys[0] if len(keys) == 1 else None
+
+    def page_key(self, table_name):
+        return "rowid"
+
+    def text_columns(self, table_name):
+        return {col[1] for col in self.conn.execute(f"PRAGMA table_info('{table_name}');")
+                if sqlite_text_affinity(col[2])}
+
+    def ensure_sort_index(self, table_name, column):
+        """
+        Индекс для сортировки создаётся и в реплике: журнал изменений DDL не переносит,
+        а без индекса сортировка по реплике шла бы полным просмотром.
+        Реплика при этом не перезагружается, если другой схемы файл не менял.
+        """
+        before = schema_version(self.conn)
+        super().ensure_sort_index(table_name, column)
+        if self.replica is None or schema_version(self.conn) == before:
+            return
+        self.replica.execute(
+            f'CREATE INDEX IF NOT EXISTS "_sort_{table_name}_{column}" ON "{table_name}" ("{column}");')
+        if self._replica_schema == before:
+            self._replica_schema = schema_version(self.conn)
+
+    def execute(self, query, params=()):
+        try:
+            self.cursor.execute(query, params)
+            self.conn.commit()
+            self._replica_stale = True
+        except sqlite3.Error as e:
+            messagebox.showerror("Ошибка БД", f"Произошла ошибка: {e}")
+            return False
+        return True
+
+    def fetchall(self, query, params=()):
+        cursor = self._read_cursor(query)
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+    def fetchone(self, query, params=()):
+        cursor = self._read_cursor(query)
+        cursor.execute(query, params)
+        return cursor.fetchone()
+
+    @contextmanager
+    def transaction(self):
+        """Транзакция на основном соединении: фиксация при успешном выходе, откат при исключении."""
+        try:
+            yield self.cursor
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        finally:
+            self._replica_stale = True
+
+    def iterate(self, query, params=(), chunk_size=1000):
+        """Потоковое чтение запроса порциями fetchmany(chunk_size) через отдельное соединение."""
+        conn = sqlite3.connect(**self.connection_params)
+        try:
+            if self.archive_path:
+                attach_archive(conn, self.archive_path)
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+
+    def _console_connection(self):
+        """Отдельное соединение для консоли SQL, используемое из фоновых потоков."""
+        if self.console_conn is None:
+            self.console_conn = sqlite3.connect(**self.connection_params, check_same_thread=False)
+            if self.archive_path:
+                attach_archive(self.console_conn, self.archive_path)
+        return self.console_conn
+
+    def explain(self, query):
+        """План выполнения запроса (EXPLAIN QUERY PLAN) в виде строк с отступами."""
+        rows = self._console_connection().execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+        depth = {0: -1}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node_id] + detail)
+        return lines
+
+    def run_console_query(self, query, on_batch, on_done, batch_size=500):
+        """
+        Запуск запроса консоли в фоне. Результаты недавних одинаковых запросов на
+        чтение (is_read_only), не зависящих от времени и случайных чисел, берутся из кэша, пока не изменилась база (PRAGMA data_version).
+        on_done(elapsed, count, error, cached) вызывается по завершении.
+        Возвращает QueryJob или None, если ответ взят из кэша.
+        """
+        conn = self._console_connection()
+        version = conn.execute("PRAGMA data_version;").fetchone()[0]
+        if version != self._query_cache_version:
+            self.query_cache.clear()
+            self._query_cache_version = version
+        key = query.strip()
+        if key in self.query_cache:
+            self.query_cache.move_to_end(key)
+            columns, rows = self.query_cache[key]
+            for i in range(0, len(rows), batch_size):
+                on_batch(columns, rows[i:i + batch_size])
+            on_done(0.0, len(rows), None, True)
+            return None
+
+        functions = set()
+        is_read = is_read_only(conn, key, functions)
+        collected = {"columns": [], "rows": [], "complete": is_read and is_deterministic(key, functions)}
+
+        def batch(columns, rows):
+            if collected["complete"]:
+                collected["columns"] = columns
+                collected["rows"].extend(rows)
+                if len(collected["rows"]) > QUERY_CACHE_MAX_ROWS:
+                    collected["complete"] = False
+                    collected["rows"] = []
+            on_batch(columns, rows)
+
+        def done(elapsed, count, error):
+            if not is_read:
+                # Запрос мог изменить данные — кэш больше не актуален
+                self.query_cache.clear()
+            elif error is None and collected["complete"]:
+                self.query_cache[key] = (collected["columns"], collected["rows"])
+                while len(self.query_cache) > QUERY_CACHE_SIZE:
+                    self.query_cache.popitem(last=False)
+            on_done(elapsed, count, error, False)
+
+        return QueryJob(conn, query, batch, done, batch_size).start()
+
+    def export(self, path, table=None, query=None, params=(), fmt="csv", compress=False,
+               chunk_size=1000, workers=1, progress=None):
+        """
+        Потоковая выгрузка таблицы или запроса в CSV, JSONL или Parquet.
+        Строки читаются порциями fetchmany(chunk_size), поэтому память не растёт
+        с размером таблицы. compress=True сжимает результат gzip.
+        Таблица при workers > 1 делится на диапазоны rowid, которые выгружаются
+        параллельно и затем склеиваются по порядку (кроме Parquet).
+        progress(done, total) вызывается после каждой порции; total для запроса — None.
+        Возвращает количество выгруженных строк.
+        """
+        if (table is None) == (query is None):
+            raise ValueError("Нужно указать либо table, либо query")
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Неизвестный формат: {fmt}")
+        total = None
+        if table is not None:
+            query = f'SELECT * FROM "{table}"'
+            conn = sqlite3.connect(**self.connection_params)
+            try:
+                total, min_rowid, max_rowid = conn.execute(
+                    f'SELECT COUNT(*), MIN(rowid), MAX(rowid) FROM "{table}";').fetchone()
+            finally:
+                conn.close()
+            if workers > 1 and fmt != "parquet" and total > chunk_size * workers:
+                return self._export_parallel(path, query, fmt, compress, chunk_size, workers,
+                                             min_rowid, max_rowid, total, progress)
+        done = 0
+
+        def on_chunk(rows):
+            nonlocal done
+            done += rows
+            if progress:
+                progress(done, total)
+
+        conn = sqlite3.connect(**self.connection_params)
+        try:
+            return write_export(conn.execute(query, params), path, fmt, compress, chunk_size, on_chunk)
+        finally:
+            conn.close()
+
+    def _export_parallel(self, path, query, fmt, compress, chunk_size, workers,
+                         min_rowid, max_rowid, total, progress):
+        step = (max_rowid - min_rowid) // workers + 1
+        ranges = [(min_rowid + i * step, min_rowid + (i + 1) * step - 1) for i in range(workers)]
+        parts = [f"{path}.part{i}" for i in range(workers)]
+        lock = threading.Lock()
+        done = 0
+
+        def on_chunk(rows):
+            nonlocal done
+            with lock:
+                done += rows
+                if progress:
+                    progress(done, total)
+
+        def export_range(index):
+            low, high = ranges[index]
+            conn = sqlite3.connect(**self.connection_params)
+            try:
+                cursor = conn.execute(f"{query} WHERE rowid BETWEEN ? AND ? ORDER BY rowid;", (low, high))
+                return write_export(cursor, parts[index], fmt, compress, chunk_size, on_chunk,
+                                    header=(index == 0))
+            finally:
+                conn.close()
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                exported = sum(pool.map(export_range, range(workers)))
+            # Части CSV/JSONL (и gzip-потоки) можно просто склеить по порядку
+            with open(path, "wb") as out:
+                for part in parts:
+                    with open(part, "rb") as f:
+                        shutil.copyfileobj(f, out)
+        finally:
+            for part in parts:
+                if os.path.exists(part):
+                    os.remove(part)
+        return exported
+
+    def close(self):
+        if self.replica is not None:
+            self.replica.close()
+            if self._replica_seq is not None and not self.conn.in_transaction:
+                drop_cdc_watermark(self.conn, self.consumer)
+                compact_cdc_log(self.conn)
+        if self.console_conn is not None:
+            self.console_conn.close()
+        self.conn.close()
+
+# Действия авторизатора SQLite, не изменяющие базу и настройки соединения
+READ_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+# Запросы на чтение начинаются с одного из этих слов
+READ_KEYWORDS = ("SELECT", "WITH", "VALUES")
+# PRAGMA, которые только читают сведения о схеме; остальные (optimize, wal_checkpoint,
+# incremental_vacuum и т.п.) могут менять файл и считаются изменяющими
+READ_PRAGMAS = {"table_info", "table_xinfo", "index_list", "index_info", "index_xinfo", "foreign_key_list",
+                "table_list", "database_list", "collation_list"}
+# Функции, результат которых меняется без изменения базы
+VOLATILE_FUNCTIONS = {"random", "randomblob", "changes", "total_changes", "last_insert_rowid"}
+
+def is_read_only(conn, query, functions=None):
+    """
+    Аналог sqlite3_stmt_readonly. Читающим считается запрос, который начинается
+    с SELECT/WITH/VALUES и компилируется через EXPLAIN (без выполнения) с авторизатором,
+    запрещающим любое действие, кроме чтения (так отсекается WITH ... DELETE),
+    либо PRAGMA из READ_PRAGMAS без присваивания. Всё остальное — VACUUM, прочие PRAGMA,
+    ошибочные запросы — считается изменяющим.
+    В functions, если передано множество, собираются имена вызываемых функций.
+    """
+    pragma = re.match(r'\s*PRAGMA\s+(?:"?\w+"?\s*\.\s*)?"?(\w+)"?\s*(=)?', query, re.IGNORECASE)
+    if pragma:
+        return pragma.group(1).lower() in READ_PRAGMAS and not pragma.group(2)
+    if not query.lstrip().upper().startswith(READ_KEYWORDS):
+        return False
+    functions = set() if functions is None else functions
+
+    def authorizer(action, arg1, arg2, db_name, source):
+        if action == sqlite3.SQLITE_FUNCTION:
+            functions.add(arg2.lower())
+        if action in READ_ACTIONS:
+            return sqlite3.SQLITE_OK
+        if action == sqlite3.SQLITE_PRAGMA and arg1.lower() in READ_PRAGMAS:
+            return sqlite3.SQLITE_OK
+        return sqlite3.SQLITE_DENY
+
+    conn.set_authorizer(authorizer)
+    try:
+        conn.execute(f"EXPLAIN {query}")
+    except sqlite3.Error:
+        return False
+    finally:
+        conn.set_authorizer(None)
+    return True
+
+def is_deterministic(query, functions):
+    """
+    Результат читающего запроса зависит только от данных: в нём нет random() и подобных
+    функций (functions — имена, собранные is_read_only) и текущего времени ('now', CURRENT_*).
+    """
+    if functions & VOLATILE_FUNCTIONS:
+        return False
+    return not re.search(r"'now'|\bCURRENT_(DATE|TIME|TIMESTAMP)\b"
+                         r"|\b(date|time|datetime|julianday|unixepoch)\s*\(\s*\)", query, re.IGNORECASE)
+
+class QueryJob:
+    """
+    Выполнение запроса консоли в фоновом потоке. Строки передаются в on_batch
+    порциями fetchmany(batch_size). Отмена — через флаг, проверяемый обработчиком
+    прогресса SQLite, и Connection.interrupt().
+    """
+    def __init__(self, conn, query, on_batch, on_done, batch_size=500):
+        self.conn = conn
+        self.query = query
+        self.on_batch = on_batch
+        self.on_done = on_done
+        self.batch_size = batch_size
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.cancelled.set()
+        self.conn.interrupt()
+
+    def _run(self):
+        self.conn.set_progress_handler(lambda: 1 if self.cancelled.is_set() else 0, 1000)
+        started = time.perf_counter()
+        count = 0
+        error = None
+        try:
+            cursor = self.conn.execute(self.query)
+            columns = [col[0] for col in cursor.description] if cursor.description else []
+            while columns and not self.cancelled.is_set():
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                count += len(rows)
+                self.on_batch(columns, rows)
+            if self.cancelled.is_set():
+                raise sqlite3.OperationalError("interrupted")
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            error = e
+        finally:
+            self.conn.set_progress_handler(None, 0)
+        self.on_done(time.perf_counter() - started, count, error)
+
+EXPORT_FORMATS = ("csv", "jsonl", "parquet")
+
+def write_export(cursor, path, fmt, compress, chunk_size, on_chunk=None, header=True):
+    """Пишет результат курсора в файл порциями по chunk_size строк. Возвращает число строк."""
+    columns = [col[0] for col in cursor.description]
+    if fmt == "parquet":
+        return write_parquet(cursor, path, columns, compress, chunk_size, on_chunk)
+    if compress:
+        f = gzip.open(path, "wt", encoding="utf-8", newline="")
+    else:
+        f = open(path, "w", encoding="utf-8", newline="")
+    count = 0
+    with f:
+        writer = csv.writer(f) if fmt == "csv" else None
+        if writer and header:
+            writer.writerow(columns)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            if writer:
+                writer.writerows(rows)
+            else:
+                f.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str) + "\n"
+                             for row in rows)
+            count += len(rows)
+            if on_chunk:
+                on_chunk(len(rows))
+    return count
+
+def write_parquet(cursor, path, columns, compress, chunk_size, on_chunk=None):
+    """Выгрузка в Parquet: каждая порция строк записывается отдельной группой строк."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Для формата Parquet нужен пакет pyarrow (pip install pyarrow)")
+    writer = None
+    count = 0
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            records = [dict(zip(columns, row)) for row in rows]
+            if writer is None:
+                batch = pa.Table.from_pylist(records)
+                writer = pq.ParquetWriter(path, batch.schema, compression="gzip" if compress else "snappy")
+            else:
+                batch = pa.Table.from_pylist(records, schema=writer.schema)
+            writer.write_table(batch)
+            count += len(rows)
+            if on_chunk:
+                on_chunk(len(rows))
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+CDC_LOG_TABLE = "_cdc_log"
+CDC_STATE_TABLE = "_cdc_state"
+CDC_CONSUMERS_TABLE = "_cdc_consumers"
+# Водяной знак реплики в памяти, не обновлявшийся дольше этого срока (процесс завершился
+# аварийно), при очистке журнала удаляется; такая реплика при следующем чтении перезагрузится
+CDC_VOLATILE_TTL = 24 * 3600
+
+def is_service_table(table_name):
+    """Служебные таблицы SQLite и приложения (журнал изменений и т.п.) не показываются пользователю."""
+    return table_name.startswith("sqlite_") or table_name.startswith("_")
+
+def sqlite_text_affinity(declared_type):
+    """Текстовое сродство SQLite для объявленного типа столбца (CHAR, CLOB, TEXT, но не INT)."""
+    declared = (declared_type or "").upper()
+    return "INT" not in declared and any(name in declared for name in ("CHAR", "CLOB", "TEXT"))
+
+def get_user_tables(conn):
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()
+    return [row[0] for row in rows if not is_service_table(row[0])]
+
+def get_columns(conn, table_name):
+    return [col[1] for col in conn.execute(f"PRAGMA table_info('{table_name}');").fetchall()]
+
+def install_cdc(conn):
+    """
+    Устанавливает журнал изменений (change data capture): таблицу _cdc_log
+    и триггеры AFTER INSERT/UPDATE/DELETE на каждой пользовательской таблице.
+    Каждая запись журнала получает монотонно растущий номер seq, а потребители
+    журнала отмечают в _cdc_consumers, до какого номера они его применили.
+    json_object в теле триггера фиксирует список столбцов на момент создания,
+    поэтому триггер, текст которого отличается от нужного (добавлен столбец),
+    пересоздаётся. Всё выполняется одной транзакцией, чтобы запись между DROP
+    и CREATE не прошла мимо журнала. Повторный вызов без изменений схемы ничего не меняет.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN;")
+    try:
+        conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS "{CDC_LOG_TABLE}" (
+            "seq" INTEGER PRIMARY KEY AUTOINCREMENT,
+            "tbl" TEXT NOT NULL,
+            "op" TEXT NOT NULL,
+            "row_id" INTEGER NOT NULL,
+            "data" TEXT
+        );
+        ''')
+        conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS "{CDC_CONSUMERS_TABLE}" (
+            "name" TEXT PRIMARY KEY,
+            "last_seq" INTEGER NOT NULL,
+            "updated" REAL NOT NULL
+        );
+        ''')
+        existing = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type='trigger';").fetchall())
+        for table in get_user_tables(conn):
+            columns = get_columns(conn, table)
+            new_json = "json_object(" + ", ".join(f"'{col}', NEW.\"{col}\"" for col in columns) + ")"
+            triggers = {
+                "I": ("AFTER INSERT", f"NEW.rowid, {new_json}"),
+                "U": ("AFTER UPDATE", f"OLD.rowid, {new_json}"),
+                "D": ("AFTER DELETE", "OLD.rowid, NULL"),
+            }
+            for op, (event, values) in triggers.items():
+                name = f"_cdc_{table}_{op}"
+                sql = (f'CREATE TRIGGER "{name}" {event} ON "{table}"\n'
+                       f'BEGIN\n'
+                       f'    INSERT INTO "{CDC_LOG_TABLE}" ("tbl", "op", "row_id", "data")\n'
+                       f"    VALUES ('{table}', '{op}', {values});\n"
+                       f'END')
+                if existing.get(name) == sql:
+                    continue
+                conn.execute(f'DROP TRIGGER IF EXISTS "{name}";')
+                conn.execute(sql)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+def schema_version(conn):
+    """Счётчик изменений схемы (PRAGMA schema_version): растёт при каждом CREATE/ALTER/DROP."""
+    return conn.execute("PRAGMA schema_version;").fetchone()[0]
+
+def cdc_last_seq(conn):
+    """Последний выданный номер журнала изменений или None, если журнал не установлен."""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?;",
+                        (CDC_LOG_TABLE,)).fetchone():
+        return None
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?;", (CDC_LOG_TABLE,)).fetchone()
+    return row[0] if row else 0
+
+def cdc_gap(conn, seq):
+    """True, если часть изменений после seq уже удалена из журнала и инкрементально не догнать."""
+    first = conn.execute(f'SELECT MIN(seq) FROM "{CDC_LOG_TABLE}" WHERE seq > ?;', (seq,)).fetchone()[0]
+    if first is None:
+        return cdc_last_seq(conn) > seq
+    return first != seq + 1
+
+def set_cdc_watermark(conn, consumer, seq):
+    """Запоминает в основной базе номер журнала, до которого потребитель применил изменения."""
+    conn.execute(f'INSERT INTO "{CDC_CONSUMERS_TABLE}" ("name", "last_seq", "updated") VALUES (?, ?, ?) '
+                 'ON CONFLICT("name") DO UPDATE SET "last_seq" = excluded."last_seq", "updated" = excluded."updated";',
+                 (consumer, seq, time.time()))
+
+def drop_cdc_watermark(conn, consumer):
+    conn.execute(f'DELETE FROM "{CDC_CONSUMERS_TABLE}" WHERE "name" = ?;', (consumer,))
+
+def compact_cdc_log(conn):
+    """
+    Удаляет из журнала изменения, уже применённые всеми потребителями
+    (не новее наименьшего водяного знака). Без потребителей журнал очищается
+    целиком: новый потребитель начинает со снимка. Возвращает число удалённых записей.
+    """
+    conn.execute(f'DELETE FROM "{CDC_CONSUMERS_TABLE}" WHERE "name" LIKE \'memory:%\' AND "updated" < ?;',
+                 (time.time() - CDC_VOLATILE_TTL,))
+    low = conn.execute(f'SELECT MIN("last_seq") FROM "{CDC_CONSUMERS_TABLE}";').fetchone()[0]
+    if low is None:
+        cur = conn.execute(f'DELETE FROM "{CDC_LOG_TABLE}";')
+    else:
+        cur = conn.execute(f'DELETE FROM "{CDC_LOG_TABLE}" WHERE seq <= ?;', (low,))
+    conn.commit()
+    return cur.rowcount
+
+def uninstall_cdc(conn):
+    """Удаляет триггеры и журнал изменений."""
+    triggers = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='trigger' AND name LIKE '\\_cdc\\_%' ESCAPE '\\';").fetchall()
+    for (name,) in triggers:
+        conn.execute(f'DROP TRIGGER IF EXISTS "{name}";')
+    conn.execute(f'DROP TABLE IF EXISTS "{CDC_LOG_TABLE}";')
+    conn.execute(f'DROP TABLE IF EXISTS "{CDC_CONSUMERS_TABLE}";')
+    conn.commit()
+
+def apply_change(conn, table, op, row_id, data):
+    """Применяет одну запись журнала изменений к соединению conn."""
+    if op == "D":
+        conn.execute(f'DELETE FROM "{table}" WHERE rowid = ?;', (row_id,))
+        return
+    values = json.loads(data)
+    if op == "U":
+        # Строка могла сменить rowid — удаляем старую версию
+        conn.execute(f'DELETE FROM "{table}" WHERE rowid = ?;', (row_id,))
+    column_list = ", ".join(f'"{col}"' for col in values)
+    placeholders = ", ".join("?" for _ in values)
+    conn.execute(f'INSERT OR REPLACE INTO "{table}" ({column_list}) VALUES ({placeholders});',
+                 list(values.values()))
+
+class ChangeReplicator:
+    """
+    Инкрементальная репликация основной базы во вторичный файл SQLite по журналу _cdc_log.
+    При первом запуске вторичная база заполняется согласованным снимком,
+    затем применяются пакеты изменений начиная с последнего применённого номера.
+    Изменения схемы (таблицы, столбцы, индексы) переносятся при sync; после
+    добавления таблиц или столбцов вторичная база перезагружается снимком.
+    """
+    def __init__(self, connection_params, replica_path, batch_size=500):
+        self.source = sqlite3.connect(**connection_params)
+        self.replica = sqlite3.connect(replica_path)
+        self.batch_size = batch_size
+        self.consumer = f"file:{os.path.abspath(replica_path)}"
+        install_cdc(self.source)
+        self._schema_version = schema_version(self.source)
+        self.replica.execute(f'''
+        CREATE TABLE IF NOT EXISTS "{CDC_STATE_TABLE}" (
+            "id" INTEGER PRIMARY KEY CHECK ("id" = 1),
+            "last_seq" INTEGER NOT NULL
+        );
+        ''')
+        self.replica.commit()
+
+    def last_seq(self):
+        row = self.replica.execute(f'SELECT last_seq FROM "{CDC_STATE_TABLE}" WHERE id = 1;').fetchone()
+        return row[0] if row else None
+
+    def _set_last_seq(self, seq):
+        """Номер сохраняется во вторичной базе и фиксируется; затем он же ставится водяным знаком в основной."""
+        self.replica.execute(f'INSERT OR REPLACE INTO "{CDC_STATE_TABLE}" (id, last_seq) VALUES (1, ?);', (seq,))
+        self.replica.commit()
+        set_cdc_watermark(self.source, self.consumer, seq)
+        self.source.commit()
+
+    def _ensure_tables(self):
+        """
+        Переносит во вторичную базу недостающие таблицы, столбцы (ALTER TABLE ADD COLUMN)
+        и индексы основной базы. Возвращает True, если добавлены таблицы или столбцы:
+        их прежнее содержимое в журнал не попадало и переносится только снимком.
+        """
+        changed = False
+        existing = set(get_user_tables(self.replica))
+        indexes = {row[0] for row in self.replica.execute("SELECT name FROM sqlite_master WHERE type='index';")}
+        objects = self.source.execute(
+            "SELECT type, name, tbl_name, sql FROM sqlite_master "
+            "WHERE type IN ('table', 'index') AND sql IS NOT NULL ORDER BY type = 'index';").fetchall()
+        for kind, name, table, sql in objects:
+            if is_service_table(table):
+                continue
+            if kind == "index":
+                if name not in indexes:
+                    self.replica.execute(sql)
+            elif table not in existing:
+                self.replica.execute(sql)
+                changed = True
+            else:
+                present = set(get_columns(self.replica, table))
+                for _, col, col_type, _, default, _ in self.source.execute(f"PRAGMA table_info('{table}');"):
+                    if col not in present:
+                        self.replica.execute(f'ALTER TABLE "{table}" ADD COLUMN "{col}" {col_type}'
+                                             + (f" DEFAULT {default}" if default is not None else "") + ";")
+                        changed = True
+        self.replica.commit()
+        return changed
+
+    def _refresh_schema(self):
+        """
+        Если схема основной базы изменилась, пересоздаёт триггеры журнала под новые
+        столбцы и переносит изменения схемы во вторичную базу.
+        Возвращает True, если нужна повторная загрузка снимком (см. _ensure_tables).
+        """
+        version = schema_version(self.source)
+        if version != self._schema_version:
+            install_cdc(self.source)
+            self._schema_version = schema_version(self.source)
+        return self._ensure_tables()
+
+    def snapshot(self):
+        """
+        Полная начальная загрузка. Номер журнала и данные читаются
+        в одной транзакции чтения, поэтому снимок согласован с журналом.
+        """
+        self._ensure_tables()
+        self.source.execute("BEGIN;")
+        try:
+            max_seq = cdc_last_seq(self.source)
+            for table in get_user_tables(self.source):
+                columns = get_columns(self.source, table)
+                column_list = ", ".join(f'"{col}"' for col in columns)
+                placeholders = ", ".join("?" for _ in columns)
+                self.replica.execute(f'DELETE FROM "{table}";')
+                cur = self.source.execute(f'SELECT {column_list} FROM "{table}";')
+                while True:
+                    rows = cur.fetchmany(self.batch_size)
+                    if not rows:
+                        break
+                    self.replica.executemany(
+                        f'INSERT INTO "{table}" ({column_list}) VALUES ({placeholders});', rows)
+        finally:
+            self.source.execute("COMMIT;")
+        self._set_last_seq(max_seq)
+        return max_seq
+
+    def sync(self):
+        """
+        Применяет все накопившиеся изменения пакетами по batch_size.
+        Каждый пакет применяется в одной транзакции вместе с новым last_seq,
+        поэтому после сбоя репликация продолжается с последнего применённого номера.
+        Возвращает количество применённых изменений.
+        """
+        last_seq = self.last_seq()
+        if self._refresh_schema() or last_seq is None or cdc_gap(self.source, last_seq):
+            # Новые таблицы и столбцы, а также удалённая часть журнала переносятся снимком
+            last_seq = self.snapshot()
+        applied = 0
+        while True:
+            batch = self.source.execute(
+                f'SELECT seq, tbl, op, row_id, data FROM "{CDC_LOG_TABLE}" WHERE seq > ? ORDER BY seq LIMIT ?;',
+                (last_seq, self.batch_size)).fetchall()
+            if not batch:
+                break
+            for seq, table, op, row_id, data in batch:
+                apply_change(self.replica, table, op, row_id, data)
+            last_seq = batch[-1][0]
+            self._set_last_seq(last_seq)
+            applied += len(batch)
+        return applied
+
+    def compact(self):
+        """Удаляет из журнала изменения, применённые всеми потребителями (см. compact_cdc_log)."""
+        return compact_cdc_log(self.source)
+
+    def close(self):
+        self.source.close()
+        self.replica.close()
+
+class BackupManager:
+    """
+    Онлайн-резервное копирование через sqlite3.Connection.backup.
+    Копирование идёт порциями по pages страниц с паузой sleep между ними,
+    поэтому писатели не блокируются на всё время копирования.
+    Снимки хранятся в backup_dir, старые удаляются (остаются последние keep).
+    """
+    def __init__(self, connection_params, backup_dir="backups", keep=5, pages=64, sleep=0.05):
+        self.connection_params = connection_params
+        self.backup_dir = backup_dir
+        self.keep = keep
+        self.pages = pages
+        self.sleep = sleep
+        self._stop_event = threading.Event()
+        self._scheduler = None
+
+    def snapshot_name(self):
+        base = os.path.splitext(os.path.basename(self.connection_params["database"]))[0]
+        return f"{base}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.sqlite3"
+
+    def list_snapshots(self):
+        if not os.path.isdir(self.backup_dir):
+            return []
+        base = os.path.splitext(os.path.basename(self.connection_params["database"]))[0]
+        names = [name for name in os.listdir(self.backup_dir)
+                 if name.startswith(base + "-") and name.endswith(".sqlite3")]
+        return [os.path.join(self.backup_dir, name) for name in sorted(names)]
+
+    @staticmethod
+    def verify(path):
+        """Проверка снимка через PRAGMA integrity_check."""
+        conn = sqlite3.connect(path)
+        try:
+            result = conn.execute("PRAGMA integrity_check;").fetchall()
+        finally:
+            conn.close()
+        return result == [("ok",)]
+
+    def backup(self, target_path=None, progress=None):
+        """
+        Создает снимок базы и проверяет его. Снимок пишется во временный файл
+        и переименовывается только после успешной проверки.
+        progress(copied, total) вызывается после каждой порции страниц.
+        Возвращает путь к снимку.
+        """
+        rotate = target_path is None
+        if rotate:
+            os.makedirs(self.backup_dir, exist_ok=True)
+            target_path = os.path.join(self.backup_dir, self.snapshot_name())
+        tmp_path = target_path + ".part"
+
+        def on_progress(status, remaining, total):
+            if progress:
+                progress(total - remaining, total)
+
+        source = sqlite3.connect(**self.connection_params)
+        try:
+            target = sqlite3.connect(tmp_path)
+            try:
+                source.backup(target, pages=self.pages, progress=on_progress, sleep=self.sleep)
+            finally:
+                target.close()
+            verified = self.verify(tmp_path)
+        except BaseException:
+            # Недописанный снимок (база заблокирована, диск заполнен) не оставляем в каталоге
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            source.close()
+        if not verified:
+            os.remove(tmp_path)
+            raise sqlite3.DatabaseError(f"Снимок {target_path} не прошёл проверку целостности")
+        os.replace(tmp_path, target_path)
+        if rotate:
+            self.rotate()
+        return target_path
+
+    def rotate(self):
+        """Удаляет старые снимки, оставляя последние keep."""
+        snapshots = self.list_snapshots()
+        for path in snapshots[:max(len(snapshots) - self.keep, 0)]:
+            os.remove(path)
+
+    def start_backup(self, progress=None, done=None):
+        """
+        Запускает backup в фоновом потоке.
+        done(path, error) вызывается из фонового потока по завершении.
+        """
+        def worker():
+            try:
+                path = self.backup(progress=progress)
+            except (sqlite3.Error, OSError) as e:
+                if done:
+                    done(None, e)
+                return
+            if done:
+                done(path, None)
+
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        return thread
+
+    def start_scheduler(self, interval, progress=None, done=None):
+        """Периодическое резервное копирование раз в interval секунд."""
+        self._stop_event.clear()
+
+        def loop():
+            while not self._stop_event.is_set():
+                try:
+                    path = self.backup(progress=progress)
+                    error = None
+                except (sqlite3.Error, OSError) as e:
+                    path, error = None, e
+                if done:
+                    done(path, error)
+                self._stop_event.wait(interval)
+
+        self._scheduler = threading.Thread(target=loop, daemon=True)
+        self._scheduler.start()
+        return self._scheduler
+
+    def stop_scheduler(self):
+        self._stop_event.set()
+        if self._scheduler is not None:
+            self._scheduler.join()
+            self._scheduler = None
+
+class HyperLogLog:
+    """Приблизительный подсчёт числа различных значений (HyperLogLog, 2^p регистров)."""
+    def __init__(self, p=12):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, value):
+        h = int.from_bytes(hashlib.blake2b(repr(value).encode(), digest_size=8).digest(), "big")
+        index = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+class ColumnStats:
+    """Потоковая статистика одного столбца: различные значения и частые значения."""
+    def __init__(self, exact_limit, top_n):
+        self.exact_limit = exact_limit
+        self.top_n = top_n
+        self.values = set()
+        self.hll = None
+        self.counter = Counter()
+
+    def add(self, value):
+        if self.hll is None:
+            self.values.add(value)
+            if len(self.values) > self.exact_limit:
+                # Слишком много различных значений — переходим на HyperLogLog
+                self.hll = HyperLogLog()
+                for v in self.values:
+                    self.hll.add(v)
+                self.values = set()
+        else:
+            self.hll.add(value)
+        self.counter[value] += 1
+        if len(self.counter) > self.top_n * 100:
+            # Сокращаем счётчик до наиболее частых значений (приближённый top-N)
+            self.counter = Counter(dict(self.counter.most_common(self.top_n * 10)))
+
+    def result(self):
+        return {
+            "distinct": len(self.values) if self.hll is None else self.hll.count(),
+            "distinct_exact": self.hll is None,
+            "top_values": [[value, count] for value, count in self.counter.most_common(self.top_n)],
+        }
+
+class TableProfiler:
+    """
+    Профилирование таблиц: для каждого столбца доля NULL, число различных
+    значений (точно или HyperLogLog), min/max, частые значения и гистограмма
+    для числовых столбцов. Таблицы обрабатываются параллельно, каждая на своём
+    соединении; данные читаются порциями по chunk_size строк.
+    Результаты кэшируются до изменения PRAGMA data_version.
+    """
+    def __init__(self, connection_params, workers=4, chunk_size=5000, exact_limit=100000,
+                 top_n=5, bins=10):
+        self.connection_params = connection_params
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.exact_limit = exact_limit
+        self.top_n = top_n
+        self.bins = bins
+        self.conn = sqlite3.connect(**connection_params, check_same_thread=False)
+        self._cache = {}
+        self._cache_version = None
+
+    def profile_table(self, table):
+        conn = sqlite3.connect(**self.connection_params)
+        try:
+            columns = get_columns(conn, table)
+            aggregates = ", ".join(f'COUNT("{col}"), MIN("{col}"), MAX("{col}")' for col in columns)
+            row = conn.execute(f'SELECT COUNT(*){", " + aggregates if columns else ""} FROM "{table}";').fetchone()
+            total = row[0]
+            stats = [ColumnStats(self.exact_limit, self.top_n) for _ in columns]
+            cur = conn.execute(f'SELECT * FROM "{table}";')
+            while True:
+                rows = cur.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                for values in rows:
+                    for column_stats, value in zip(stats, values):
+                        if value is not None:
+                            column_stats.add(value)
+            profile = {"rows": total, "columns": {}}
+            for i, col in enumerate(columns):
+                non_null, min_value, max_value = row[1 + 3 * i: 4 + 3 * i]
+                column_profile = {
+                    "null_ratio": (total - non_null) / total if total else 0.0,
+                    "min": min_value,
+                    "max": max_value,
+                }
+                column_profile.update(stats[i].result())
+                column_profile["histogram"] = self._histogram(conn, table, col, min_value, max_value)
+                profile["columns"][col] = column_profile
+            return profile
+        finally:
+            conn.close()
+
+    def _histogram(self, conn, table, col, min_value, max_value):
+        """Гистограмма из bins равных интервалов; строится только для числовых столбцов."""
+        if not all(isinstance(v, (int, float)) for v in (min_value, max_value)):
+            return None
+        width = (max_value - min_value) / self.bins or 1
+        rows = conn.execute(f'''
+            SELECT MIN(CAST(("{col}" - ?) / ? AS INTEGER), ?), COUNT(*) FROM "{table}"
+            WHERE typeof("{col}") IN ('integer', 'real') GROUP BY 1 ORDER BY 1;
+            ''', (min_value, width, self.bins - 1)).fetchall()
+        counts = dict(rows)
+        return [{"from": min_value + i * width, "to": min_value + (i + 1) * width, "count": counts.get(i, 0)}
+                for i in range(self.bins)]
+
+    def profile(self, tables=None):
+        """Профиль всех (или указанных) таблиц: {таблица: профиль}."""
+        version = self.conn.execute("PRAGMA data_version;").fetchone()[0]
+        if version != self._cache_version:
+            self._cache = {}
+            self._cache_version = version
+        if tables is None:
+            tables = get_user_tables(self.conn)
+        missing = [table for table in tables if table not in self._cache]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for table, profile in zip(missing, pool.map(self.profile_table, missing)):
+                self._cache[table] = profile
+        return {table: self._cache[table] for table in tables}
+
+    def export_json(self, path, tables=None):
+        profile = self.profile(tables)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"database": self.connection_params.get("database"), "tables": profile},
+                      f, ensure_ascii=False, indent=2, default=str)
+        return profile
+
+    def close(self):
+        self.conn.close()
+
+def normalize_fio(fio):
+    """ФИО в нижнем регистре, ё → е, без знаков препинания и лишних пробелов."""
+    fio = (fio or "").lower().replace("ё", "е")
+    return " ".join(re.sub(r"[^\w\s]|\d|_", " ", fio).split())
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def score_pairs(pairs):
+    """
+    Оценка схожести пар записей (выполняется в пуле процессов).
+    pairs — список ((id, фио, дата, телефон), (id, фио, дата, телефон)).
+    Вес сравнения ФИО увеличивается, если дата рождения или телефон не заполнены.
+    """
+    scored = []
+    for left, right in pairs:
+        weights = {"fio": 0.7, "birth": 0.2, "phone": 0.1}
+        score = 0.0
+        if left[2] and right[2]:
+            score += weights["birth"] * (left[2] == right[2])
+        else:
+            weights["fio"] += weights.pop("birth")
+        if left[3] and right[3]:
+            score += weights["phone"] * (left[3] == right[3])
+        else:
+            weights["fio"] += weights.pop("phone")
+        score += weights["fio"] * difflib.SequenceMatcher(None, left[1], right[1]).ratio()
+        scored.append((left[0], right[0], round(score, 3)))
+    return scored
+
+class CitizenDeduplicator:
+    """
+    Поиск дубликатов в таблице «Граждане» без сравнения всех пар.
+    Кандидаты выбираются по ключам блокировки: префикс фамилии + дата рождения,
+    цифры телефона и триграммы ФИО. Слишком частые ключи (больше max_block записей)
+    отбрасываются, поэтому число сравнений растёт почти линейно.
+    Пары оцениваются параллельно в пуле процессов.
+    archive_path — архив (см. Archiver), ссылки в котором тоже переводятся при объединении;
+    по умолчанию используется default_archive_path, если такой файл есть.
+    """
+    def __init__(self, connection_params, threshold=0.85, max_block=50, workers=4, chunk_size=5000,
+                 archive_path=None):
+        self.connection_params = connection_params
+        self.archive_path = archive_path or default_archive_path(connection_params)
+        self.threshold = threshold
+        self.max_block = max_block
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    def load_records(self, conn, names=None):
+        """Нормализованные записи {id: (id, фио, дата, цифры телефона)}; в names, если передан, — исходные ФИО."""
+        records = {}
+        cursor = conn.execute('SELECT id, ФИО, Дата_рождения, Телефон FROM "Граждане";')
+        while True:
+            rows = cursor.fetchmany(self.chunk_size)
+            if not rows:
+                break
+            for citizen_id, fio, birth, phone in rows:
+                digits = re.sub(r"\D", "", phone or "")
+                if names is not None:
+                    names[citizen_id] = fio
+                records[citizen_id] = (citizen_id, normalize_fio(fio), (birth or "").strip(), digits)
+        return records
+
+    def blocking_keys(self, record):
+        _, fio, birth, phone = record
+        surname = fio.split(" ")[0] if fio else ""
+        keys = []
+        if surname:
+            keys.append(("surname", surname[:4], birth))
+        if len(phone) >= 7:
+            keys.append(("phone", phone))
+        keys.extend(("trigram", gram) for gram in trigrams(fio))
+        return keys
+
+    def candidate_pairs(self, records):
+        """
+        Пары-кандидаты из блоков. Для триграмм пара учитывается, только если у
+        записей не меньше половины общих триграмм среди редких.
+        """
+        blocks = {}
+        for citizen_id, record in records.items():
+            for key in self.blocking_keys(record):
+                blocks.setdefault(key, []).append(citizen_id)
+        pairs = set()
+        shared = Counter()
+        for key, ids in blocks.items():
+            if len(ids) < 2 or len(ids) > self.max_block:
+                continue
+            for i, left in enumerate(ids):
+                for right in ids[i + 1:]:
+                    if key[0] == "trigram":
+                        shared[(left, right)] += 1
+                    else:
+                        pairs.add((left, right))
+        for (left, right), common in shared.items():
+            smallest = min(len(trigrams(records[left][1])), len(trigrams(records[right][1])))
+            if common * 2 >= smallest:
+                pairs.add((left, right))
+        return pairs
+
+    def find_duplicates(self, limit=None):
+        """
+        Список предложений на объединение [(id1, ФИО1, id2, ФИО2, оценка)] по убыванию оценки.
+        limit — сколько лучших пар вернуть (по умолчанию все).
+        """
+        names = {}
+        conn = sqlite3.connect(**self.connection_params)
+        try:
+            records = self.load_records(conn, names)
+        finally:
+            conn.close()
+        pairs = [(records[left], records[right]) for left, right in self.candidate_pairs(records)]
+        chunks = [pairs[i:i + self.chunk_size] for i in range(0, len(pairs), self.chunk_size)]
+        suggestions = []
+        if len(chunks) > 1 and self.workers > 1:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                for scored in pool.map(score_pairs, chunks):
+                    suggestions.extend(scored)
+        else:
+            for chunk in chunks:
+                suggestions.extend(score_pairs(chunk))
+        suggestions = [s for s in suggestions if s[2] >= self.threshold]
+        if limit is None:
+            suggestions.sort(key=lambda s: -s[2])
+        else:
+            suggestions = heapq.nlargest(limit, suggestions, key=lambda s: s[2])
+        return [(left, names[left], right, names[right], score) for left, right, score in suggestions]
+
+    def merge(self, keep_id, duplicate_id):
+        """
+        Объединение двух записей в одной транзакции: пустые поля keep_id дополняются
+        из duplicate_id, все ссылки Гражданин_id (в том числе в архиве) переводятся
+        на keep_id, дубликат удаляется.
+        """
+        conn = sqlite3.connect(**self.connection_params)
+        try:
+            archived_schema = os.path.exists(self.archive_path)
+            if archived_schema:
+                attach_archive(conn, self.archive_path)
+            with conn:
+                columns = [col for col in get_columns(conn, "Граждане") if col != "id"]
+                set_clause = ", ".join(
+                    f'"{col}" = COALESCE(NULLIF("{col}", \'\'), (SELECT "{col}" FROM "Граждане" WHERE id = ?))'
+                    for col in columns)
+                conn.execute(f'UPDATE "Граждане" SET {set_clause} WHERE id = ?;',
+                             [duplicate_id] * len(columns) + [keep_id])
+                archived = set()
+                if archived_schema:
+                    archived = {row[0] for row in conn.execute(
+                        "SELECT name FROM archive.sqlite_master WHERE type='table';")}
+                for table in get_user_tables(conn):
+                    # Таблицы архива создаются без внешних ключей — ссылки берутся из оперативной таблицы
+                    schemas = ["main"] + (["archive"] if table in archived else [])
+                    for fk in conn.execute(f"PRAGMA foreign_key_list('{table}');").fetchall():
+                        if fk[2] == "Граждане":
+                            for schema in schemas:
+                                conn.execute(f'UPDATE {schema}."{table}" SET "{fk[3]}" = ? WHERE "{fk[3]}" = ?;',
+                                             (keep_id, duplicate_id))
+                conn.execute('DELETE FROM "Граждане" WHERE id = ?;', (duplicate_id,))
+        finally:
+            conn.close()
+
+CITIZEN_TABLE = "Граждане"
+
+def sqlite_sort_key(value):
+    """Ключ, упорядочивающий значения так же, как ORDER BY в SQLite: NULL, числа, текст, BLOB."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, value)
+
+def shard_query(path, query, params=()):
+    """Выполнение запроса на одном шарде (вызывается в пуле процессов)."""
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+
+class ShardedDatabase(StorageBackend):
+    """
+    Горизонтальное шардирование реестра граждан по нескольким файлам SQLite.
+    Гражданин попадает в партицию id % partitions, партиция закреплена за шардом;
+    зависимые строки (Призывники, Документы, Отсрочки) хранятся в шарде гражданина.
+    Прочие таблицы (Сотрудники) хранятся в шарде 0.
+    Каталог (список шардов, карта партиций, глобальные счётчики id) — отдельный файл SQLite.
+
+    Реализация StorageBackend (адрес shard:///каталог): после create шарды и есть база,
+    и интерфейс читает и пишет через них. Вставка, изменение и удаление строки
+    маршрутизируются в шард гражданина; fetch_page, fetchall, count_rows и поиск
+    выполняются на всех шардах, и результаты сливаются. Запросы execute (DDL, UPDATE/DELETE
+    по условию) выполняются на каждом шарде отдельно, не одной транзакцией.
+    Транзакция над несколькими шардами (transaction) подключает их через ATTACH,
+    поэтому шардов не больше 11 (ограничение SQLite на число подключённых баз).
+    """
+    def __init__(self, catalog_path, workers=4):
+        super().__init__()
+        self.catalog_path = catalog_path
+        self.location = catalog_path
+        self.catalog = sqlite3.connect(catalog_path)
+        self.workers = workers
+        self._pool = None
+        self.reload()
+
+    @classmethod
+    def create(cls, source_params, catalog_path, shard_count, partitions=64, workers=4):
+        """
+        Переносит обычную базу в шардированную раскладку: файлы шардов рядом с каталогом
+        (<каталог>.shardN.sqlite3), партиции распределяются по шардам по кругу.
+        После переноса данные живут в шардах (интерфейс открывается с shard:///каталог),
+        исходный файл больше не изменяется через приложение. Повторный вызов нужен только
+        после прерванного переноса: шарды и карта партиций сохраняются, досылаются строки
+        источника, которых в шардах ещё нет, уже перенесённые строки не заменяются.
+        """
+        base = os.path.splitext(catalog_path)[0]
+        catalog = sqlite3.connect(catalog_path)
+        with catalog:
+            catalog.executescript('''
+            CREATE TABLE IF NOT EXISTS "shards" ("idx" INTEGER PRIMARY KEY, "path" TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS "partitions" ("partition" INTEGER PRIMARY KEY, "shard" INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS "sequences" ("tbl" TEXT PRIMARY KEY, "value" INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS "settings" ("key" TEXT PRIMARY KEY, "value" TEXT);
+            ''')
+            catalog.execute("INSERT OR IGNORE INTO settings VALUES ('partitions', ?);", (partitions,))
+            for idx in range(shard_count):
+                catalog.execute("INSERT OR IGNORE INTO shards VALUES (?, ?);", (idx, f"{base}.shard{idx}.sqlite3"))
+            catalog.executemany("INSERT OR IGNORE INTO partitions VALUES (?, ?);",
+                                [(p, p % shard_count) for p in range(partitions)])
+        catalog.close()
+
+        source = sqlite3.connect(**source_params)
+        shards = cls(catalog_path, workers=workers)
+        try:
+            tables = get_user_tables(source)
+            for idx, path in enumerate(shards.shard_paths):
+                conn = sqlite3.connect(path)
+                for table in tables:
+                    sql = source.execute("SELECT sql FROM sqlite_master WHERE name = ?;", (table,)).fetchone()[0]
+                    conn.execute(re.sub(r"^\s*CREATE TABLE\s+(IF NOT EXISTS\s+)?", "CREATE TABLE IF NOT EXISTS ",
+                                        sql, flags=re.IGNORECASE))
+                conn.execute("ATTACH DATABASE ? AS src;", (source_params["database"],))
+                with conn:
+                    for table in tables:
+                        if table == CITIZEN_TABLE:
+                            where = f"WHERE id % {shards.partitions} IN"
+                        elif table in DEPENDENT_TABLES:
+                            where = f'WHERE "Гражданин_id" % {shards.partitions} IN'
+                        else:
+                            if idx == 0:
+                                conn.execute(f'INSERT OR IGNORE INTO main."{table}" SELECT * FROM src."{table}";')
+                            continue
+                        owned = ", ".join(str(p) for p, shard in shards.assignment.items() if shard == idx)
+                        conn.execute(f'INSERT OR IGNORE INTO main."{table}" SELECT * FROM src."{table}" '
+                                     f'{where} ({owned or "NULL"});')
+                conn.execute("DETACH DATABASE src;")
+                conn.close()
+            with shards.catalog:
+                for table in tables:
+                    max_id = source.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM "{table}";').fetchone()[0]
+                    shards.catalog.execute("INSERT INTO sequences VALUES (?, ?) ON CONFLICT (tbl) "
+                                           "DO UPDATE SET value = MAX(value, excluded.value);", (table, max_id))
+        finally:
+            source.close()
+        return shards
+
+    def reload(self):
+        """Перечитывает каталог (после ребалансировки другим процессом)."""
+        self.shard_paths = [row[0] for row in self.catalog.execute("SELECT path FROM shards ORDER BY idx;")]
+        self.partitions = int(self.catalog.execute(
+            "SELECT value FROM settings WHERE key = 'partitions';").fetchone()[0])
+        self.assignment = dict(self.catalog.execute("SELECT partition, shard FROM partitions;").fetchall())
+
+    def shard_for(self, citizen_id):
+        return self.shard_paths[self.assignment[int(citizen_id) % self.partitions]]
+
+    def reserve_ids(self, table, count):
+        """Резервирует count глобально уникальных id подряд (id не должны пересекаться между шардами). Возвращает первый."""
+        with self.catalog:
+            self.catalog.execute("INSERT OR IGNORE INTO sequences VALUES (?, 0);", (table,))
+            self.catalog.execute("UPDATE sequences SET value = value + ? WHERE tbl = ?;", (count, table))
+            return self.catalog.execute("SELECT value FROM sequences WHERE tbl = ?;", (table,)).fetchone()[0] - count + 1
+
+    def next_id(self, table):
+        return self.reserve_ids(table, 1)
+
+    def _advance_sequence(self, table, row_id):
+        """Явно заданный id не расходует счётчик, но следующий выданный должен быть больше."""
+        with self.catalog:
+            self.catalog.execute("INSERT INTO sequences VALUES (?, ?) ON CONFLICT (tbl) "
+                                 "DO UPDATE SET value = MAX(value, excluded.value);", (table, row_id))
+
+    def _shard_index(self, table, values):
+        """Номер шарда для строки {столбец: значение}; строки без гражданина хранятся в шарде 0."""
+        if table == CITIZEN_TABLE:
+            citizen_id = values.get("id")
+        elif table in DEPENDENT_TABLES:
+            citizen_id = values.get("Гражданин_id")
+        else:
+            return 0
+        if citizen_id in (None, ""):
+            return 0
+        return self.assignment[int(citizen_id) % self.partitions]
+
+    def _route(self, table, values):
+        return self.shard_paths[self._shard_index(table, values)]
+
+    @staticmethod
+    def _schema(idx):
+        """Имя схемы шарда в соединении transaction()."""
+        return "main" if idx == 0 else f"shard{idx}"
+
+    def insert(self, table, values):
+        """Вставка строки {столбец: значение} в нужный шард. Возвращает id строки."""
+        values = dict(values)
+        if values.get("id") in (None, ""):
+            values["id"] = self.next_id(table)
+        else:
+            self._advance_sequence(table, values["id"])
+        column_list = ", ".join(f'"{col}"' for col in values)
+        placeholders = ", ".join("?" for _ in values)
+        conn = sqlite3.connect(self._route(table, values))
+        try:
+            with conn:
+                conn.execute(f'INSERT INTO "{table}" ({column_list}) VALUES ({placeholders});', list(values.values()))
+        finally:
+            conn.close()
+        return values["id"]
+
+    def get_citizen(self, citizen_id):
+        """Точечный запрос: гражданин и его зависимые строки читаются только из одного шарда."""
+        conn = sqlite3.connect(self.shard_for(citizen_id))
+        try:
+            citizen = conn.execute(f'SELECT * FROM "{CITIZEN_TABLE}" WHERE id = ?;', (citizen_id,)).fetchone()
+            if citizen is None:
+                return None
+            dependents = {table: conn.execute(f'SELECT * FROM "{table}" WHERE "Гражданин_id" = ?;',
+                                              (citizen_id,)).fetchall()
+                          for table in DEPENDENT_TABLES}
+        finally:
+            conn.close()
+        return citizen, dependents
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def _table_paths(self, table):
+        """Шарды, в которых хранятся строки таблицы: все для граждан и зависимых, иначе шард 0."""
+        if table == CITIZEN_TABLE or table in DEPENDENT_TABLES:
+            return self.shard_paths
+        return self.shard_paths[:1]
+
+    def fan_out(self, query, params=(), key=None, limit=None, reverse=False, paths=None):
+        """
+        Выполняет запрос на всех шардах (или на paths) параллельно и объединяет результаты.
+        Если задан key, считается, что каждый шард вернул строки, упорядоченные по key
+        (по убыванию при reverse), и результаты сливаются с сохранением порядка;
+        limit обрезает общий результат.
+        """
+        futures = [self._executor().submit(shard_query, path, query, params) for path in paths or self.shard_paths]
+        results = [future.result() for future in futures]
+        if key is not None:
+            rows = heapq.merge(*results, key=key, reverse=reverse)
+        else:
+            rows = (row for result in results for row in result)
+        return list(itertools.islice(rows, limit))
+
+    def tables(self):
+        conn = sqlite3.connect(self.shard_paths[0])
+        try:
+            return get_user_tables(conn)
+        finally:
+            conn.close()
+
+    def count(self, table):
+        return sum(row[0] for row in self.fan_out(f'SELECT COUNT(*) FROM "{table}";', paths=self._table_paths(table)))
+
+    def get_table_names(self):
+        return sorted(self.tables())
+
+    def get_columns(self, table_name):
+        return [col[1] for col in shard_query(self.shard_paths[0], f"PRAGMA table_info('{table_name}');")]
+
+    def get_primary_key(self, table_name):
+        keys = [col[1] for col in shard_query(self.shard_paths[0], f"PRAGMA table_info('{table_name}');") if col[5]]
+        return keys[0] if len(keys) == 1 else None
+
+    def text_columns(self, table_name):
+        return {col[1] for col in shard_query(self.shard_paths[0], f"PRAGMA table_info('{table_name}');")
+                if sqlite_text_affinity(col[2])}
+
+    def page_key(self, table_name):
+        # id выдаются из общих счётчиков каталога, поэтому ключ уникален на всех шардах
+        key = self.get_primary_key(table_name)
+        return f'"{key}"' if key else "rowid"
+
+    def fetch_page(self, table_name, sort=None, desc=False, filters=None, after=None, limit=PAGE_SIZE):
+        """Страница собирается слиянием страниц всех шардов в порядке ORDER BY SQLite."""
+        query, params = self.page_query(table_name, sort, desc, filters, after, limit)
+        rows = self.fan_out(query, params, key=lambda row: (sqlite_sort_key(row[0]), sqlite_sort_key(row[1])),
+                            limit=limit, reverse=desc, paths=self._table_paths(table_name))
+        return [((row[0], row[1]), row[2:]) for row in rows]
+
+    def count_rows(self, table_name):
+        return self.count(table_name)
+
+    def fetchall(self, query, params=()):
+        """Строки запроса со всех шардов подряд (порядок и LIMIT действуют внутри шарда)."""
+        return self.fan_out(query, params)
+
+    def fetchone(self, query, params=()):
+        """Первая найденная строка; шарды опрашиваются по очереди до первого совпадения."""
+        for path in self.shard_paths:
+            conn = sqlite3.connect(path)
+            try:
+                row = conn.execute(query, params).fetchone()
+            finally:
+                conn.close()
+            if row is not None:
+                return row
+        return None
+
+    def iterate(self, query, params=(), chunk_size=1000):
+        """Потоковое чтение запроса по шардам по очереди, порциями fetchmany(chunk_size)."""
+        for path in self.shard_paths:
+            conn = sqlite3.connect(path)
+            try:
+                cursor = conn.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield from rows
+            finally:
+                conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Транзакция над всеми шардами: шард 0 открывается как main, остальные
+        подключаются через ATTACH под именами _schema(idx), и SQLite фиксирует изменения
+        во всех файлах атомарно. Таблицы в запросах указываются со схемой.
+        """
+        conn = sqlite3.connect(self.shard_paths[0])
+        try:
+            for idx, path in enumerate(self.shard_paths[1:], 1):
+                conn.execute(f"ATTACH DATABASE ? AS {self._schema(idx)};", (path,))
+            yield conn.cursor()
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def execute(self, query, params=()):
+        """
+        Запрос без маршрутизации (DDL, UPDATE/DELETE по условию) выполняется на каждом шарде.
+        Вставка должна попасть в шард гражданина и делается через insert_row/insert_rows.
+        """
+        if query.lstrip().upper().startswith(("INSERT", "REPLACE")):
+            messagebox.showerror("Ошибка БД", "Вставка в шардированную базу выполняется через insert_row.")
+            return False
+        try:
+            for path in self.shard_paths:
+                conn = sqlite3.connect(path)
+                try:
+                    with conn:
+                        conn.execute(query, params)
+                finally:
+                    conn.close()
+        except sqlite3.Error as e:
+            messagebox.showerror("Ошибка БД", f"Произошла ошибка: {e}")
+            return False
+        return True
+
+    def insert_rows(self, table_name, columns, rows, batch_size=1000):
+        """
+        Пакетная вставка одной транзакцией над всеми шардами: строки без id получают id
+        из каталога, каждая строка пишется в шард своего гражданина.
+        Возвращает количество вставленных строк.
+        """
+        columns = list(columns) + ([] if "id" in columns else ["id"])
+        column_list = ", ".join(f'"{col}"' for col in columns)
+        placeholders = ", ".join("?" for _ in columns)
+        rows = iter(rows)
+        count = 0
+        with self.transaction() as cursor:
+            for batch in iter(lambda: list(itertools.islice(rows, batch_size)), []):
+                batch = [dict(itertools.zip_longest(columns, row)) for row in batch]
+                missing = [values for values in batch if values["id"] in (None, "")]
+                if missing:
+                    first = self.reserve_ids(table_name, len(missing))
+                    for offset, values in enumerate(missing):
+                        values["id"] = first + offset
+                if len(missing) < len(batch):
+                    self._advance_sequence(table_name, max(int(values["id"]) for values in batch))
+                routed = {}
+                for values in batch:
+                    routed.setdefault(self._shard_index(table_name, values), []).append(
+                        [values[col] for col in columns])
+                for idx, shard_rows in routed.items():
+                    cursor.executemany(f'INSERT INTO {self._schema(idx)}."{table_name}" ({column_list}) '
+                                       f'VALUES ({placeholders});', shard_rows)
+                count += len(batch)
+        return count
+
+    def insert_row(self, table_name, columns, values):
+        try:
+            self.insert_rows(table_name, columns, [values])
+        except sqlite3.Error as e:
+            messagebox.showerror("Ошибка БД", f"Произошла ошибка: {e}")
+            return False
+        return True
+
+    def update_row(self, table_name, columns, new_values, old_values):
+        """
+        Изменение строки в её шарде. Если у зависимой строки сменился гражданин
+        из другого шарда, строка переносится туда в той же транзакции.
+        """
+        old, new = dict(zip(columns, old_values)), dict(zip(columns, new_values))
+        if table_name == CITIZEN_TABLE and str(old.get("id")) != str(new.get("id")):
+            messagebox.showerror("Ошибка", "id гражданина определяет его шард и не меняется.")
+            return False
+        source, target = self._shard_index(table_name, old), self._shard_index(table_name, new)
+        new_values = self.bind_values(table_name, columns, new_values)
+        old_values = self.bind_values(table_name, columns, old_values)
+        set_clause = ", ".join(f'"{col}" = ?' for col in columns)
+        where_clause = " AND ".join(f'"{col}" = ?' for col in columns)
+        try:
+            with self.transaction() as cursor:
+                cursor.execute(f'UPDATE {self._schema(source)}."{table_name}" SET {set_clause} WHERE {where_clause};',
+                               list(new_values) + list(old_values))
+                if source != target:
+                    cursor.execute(f'INSERT INTO {self._schema(target)}."{table_name}" '
+                                   f'SELECT * FROM {self._schema(source)}."{table_name}" WHERE {where_clause};',
+                                   list(new_values))
+                    cursor.execute(f'DELETE FROM {self._schema(source)}."{table_name}" WHERE {where_clause};',
+                                   list(new_values))
+        except sqlite3.Error as e:
+            messagebox.showerror("Ошибка БД", f"Произошла ошибка: {e}")
+            return False
+        return True
+
+    def delete_row(self, table_name, columns, values):
+        idx = self._shard_index(table_name, dict(zip(columns, values)))
+        values = self.bind_values(table_name, columns, values)
+        where_clause = " AND ".join(f'"{col}" = ?' for col in columns)
+        try:
+            with self.transaction() as cursor:
+                cursor.execute(f'DELETE FROM {self._schema(idx)}."{table_name}" WHERE {where_clause};', list(values))
+        except sqlite3.Error as e:
+            messagebox.showerror("Ошибка БД", f"Произошла ошибка: {e}")
+            return False
+        return True
+
+    def search_citizens(self, text, limit=100):
+        """Поиск граждан по подстроке ФИО на всех шардах, результат упорядочен по ФИО."""
+        return self.fan_out(f'SELECT * FROM "{CITIZEN_TABLE}" WHERE ФИО LIKE ? ORDER BY ФИО, id LIMIT ?;',
+                            (f"%{text}%", limit), key=lambda row: (row[1], row[0]), limit=limit)
+
+    def move_partition(self, partition, target_shard):
+        """
+        Перенос партиции в другой шард. Данные копируются и удаляются в одной транзакции
+        над двумя файлами (ATTACH), затем обновляется каталог. Если процесс прервётся
+        между этими шагами, повторный вызов безопасен: строк в старом шарде уже нет.
+        """
+        source_path = self.shard_paths[self.assignment[partition]]
+        target_path = self.shard_paths[target_shard]
+        if source_path != target_path:
+            conn = sqlite3.connect(target_path)
+            try:
+                conn.execute("ATTACH DATABASE ? AS src;", (source_path,))
+                with conn:
+                    for table, col in [(CITIZEN_TABLE, "id")] + [(t, "Гражданин_id") for t in DEPENDENT_TABLES]:
+                        condition = f'"{col}" % {self.partitions} = ?'
+                        conn.execute(f'INSERT INTO main."{table}" SELECT * FROM src."{table}" WHERE {condition};',
+                                     (partition,))
+                        conn.execute(f'DELETE FROM src."{table}" WHERE {condition};', (partition,))
+                conn.execute("DETACH DATABASE src;")
+            finally:
+                conn.close()
+        with self.catalog:
+            self.catalog.execute("UPDATE partitions SET shard = ? WHERE partition = ?;", (target_shard, partition))
+        self.assignment[partition] = target_shard
+
+    def add_shard(self):
+        """Добавляет пустой шард со схемой шарда 0. Возвращает его номер."""
+        idx = len(self.shard_paths)
+        path = f"{os.path.splitext(self.catalog_path)[0]}.shard{idx}.sqlite3"
+        first = sqlite3.connect(self.shard_paths[0])
+        conn = sqlite3.connect(path)
+        try:
+            with conn:
+                for (sql,) in first.execute("SELECT sql FROM sqlite_master WHERE type='table' "
+                                            "AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\';"):
+                    conn.execute(sql)
+        finally:
+            conn.close()
+            first.close()
+        with self.catalog:
+            self.catalog.execute("INSERT INTO shards VALUES (?, ?);", (idx, path))
+        self.shard_paths.append(path)
+        return idx
+
+    def rebalance(self):
+        """Выравнивает число партиций на шардах, перенося лишние на наименее загруженные."""
+        moves = []
+        target = len(self.assignment) // len(self.shard_paths)
+        owned = {idx: sorted(p for p, s in self.assignment.items() if s == idx) for idx in range(len(self.shard_paths))}
+        spare = [p for idx in owned for p in owned[idx][target + (idx < len(self.assignment) % len(self.shard_paths)):]]
+        for idx in owned:
+            quota = target + (idx < len(self.assignment) % len(self.shard_paths))
+            while len(owned[idx]) < quota and spare:
+                partition = spare.pop()
+                self.move_partition(partition, idx)
+                owned[idx].append(partition)
+                moves.append((partition, idx))
+        return moves
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+        self.catalog.close()
+
+# Правила архивации: таблица -> (столбец даты, через сколько дней после неё строка уходит в архив)
+ARCHIVE_POLICIES = {
+    "Отсрочки": ("Срок_действия", 365),
+    "Призывники": ("Дата_призыва", 3 * 365),
+    "Документы": ("Дата_выдачи", 10 * 365),
+}
+ARCHIVE_VIEW_SUFFIX = "_с_архивом"
+
+def iso_date_sql(column, alias=None):
+    """Выражение SQL, переводящее дату dd.mm.yyyy (формат DateEntry) в yyyy-mm-dd."""
+    ref = f'{alias}."{column}"' if alias else f'"{column}"'
+    return f"(substr({ref}, 7, 4) || '-' || substr({ref}, 4, 2) || '-' || substr({ref}, 1, 2))"
+
+def attach_archive(conn, archive_path, tables=ARCHIVE_POLICIES):
     """
-    Класс-обертка для работы с базой данных.
-    Инкапсулирует подключение, выполнение запросов и получение данных.
+    Подключает архив к соединению (ATTACH ... AS archive) и создает временные
+    представления <таблица>_с_архивом = оперативные строки UNION ALL архивные.
+    """
+    conn.execute("ATTACH DATABASE ? AS archive;", (archive_path,))
+    archived = {row[0] for row in conn.execute("SELECT name FROM archive.sqlite_master WHERE type='table';")}
+    for table in tables:
+        if table in archived:
+            conn.execute(f'CREATE TEMP VIEW IF NOT EXISTS "{table}{ARCHIVE_VIEW_SUFFIX}" AS '
+                         f'SELECT * FROM main."{table}" UNION ALL SELECT * FROM archive."{table}";')
+
+class Archiver:
+    """
+    Перенос устаревших строк (см. ARCHIVE_POLICIES) в отдельный файл архива.
+    Строки переносятся пакетами по batch_size, каждый пакет — одна транзакция
+    над основной базой и подключённым архивом. Для поиска устаревших строк
+    создаётся индекс по выражению даты.
     """
-    def __init__(self, connection_params):
+    def __init__(self, connection_params, archive_path=None, policies=ARCHIVE_POLICIES, batch_size=1000):
         self.connection_params = connection_params
+        self.archive_path = archive_path or default_archive_path(connection_params)
+        self.policies = policies
+        self.batch_size = batch_size
         self.conn = sqlite3.connect(**connection_params)
-        self.cursor = self.conn.cursor()
+        self.conn.execute("ATTACH DATABASE ? AS archive;", (self.archive_path,))
+
+    def prepare(self, table, column):
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS archive."{table}" AS SELECT * FROM main."{table}" WHERE 0;')
+        self.conn.execute(f'CREATE INDEX IF NOT EXISTS main."_archive_{table}_{column}" '
+                          f'ON "{table}" ({iso_date_sql(column)});')
+
+    def archive(self, today=None, progress=None):
+        """
+        Переносит все строки старше срока хранения. progress(table, moved)
+        вызывается после каждого пакета. Возвращает {таблица: перенесено строк}.
+        """
+        today = today or datetime.now().date()
+        moved = {}
+        for table, (column, days) in self.policies.items():
+            self.prepare(table, column)
+            cutoff = (today - timedelta(days=days)).isoformat()
+            moved[table] = 0
+            while True:
+                rowids = [row[0] for row in self.conn.execute(
+                    f'SELECT rowid FROM main."{table}" WHERE {iso_date_sql(column)} < ? '
+                    f'AND "{column}" LIKE \'__.__.____\' LIMIT ?;', (cutoff, self.batch_size))]
+                if not rowids:
+                    break
+                placeholders = ", ".join("?" for _ in rowids)
+                with self.conn:
+                    self.conn.execute(f'INSERT INTO archive."{table}" SELECT * FROM main."{table}" '
+                                      f'WHERE rowid IN ({placeholders});', rowids)
+                    self.conn.execute(f'DELETE FROM main."{table}" WHERE rowid IN ({placeholders});', rowids)
+                moved[table] += len(rowids)
+                if progress:
+                    progress(table, moved[table])
+        return moved
+
+    def restore(self, table, row_id):
+        """Возвращает строку из архива в оперативную таблицу."""
+        with self.conn:
+            self.conn.execute(f'INSERT INTO main."{table}" SELECT * FROM archive."{table}" WHERE id = ?;', (row_id,))
+            self.conn.execute(f'DELETE FROM archive."{table}" WHERE id = ?;', (row_id,))
+
+    def close(self):
+        self.conn.close()
+
+def default_archive_path(connection_params):
+    return os.path.splitext(connection_params["database"])[0] + ".archive.sqlite3"
+
+# Отслеживаемые сроки: таблица -> столбец даты
+DEADLINE_COLUMNS = {
+    "Отсрочки": "Срок_действия",
+    "Призывники": "Дата_призыва",
+}
+DUE_QUEUE_TABLE = "_due_queue"
+DUE_LOOKAHEAD_DAYS = 14
+
+def install_due_queue(conn):
+    """
+    Очередь сроков _due_queue (таблица, id строки, дата ISO, признак уведомления),
+    поддерживаемая триггерами на таблицах из DEADLINE_COLUMNS. Частичный индекс
+    по дате содержит только ещё не показанные сроки, поэтому выборка новых сроков
+    не зависит от общего числа строк. Существующие строки заносятся в очередь один раз,
+    при первой установке триггеров таблицы; повторный вызов безопасен и дёшев.
+    """
+    conn.execute(f'''
+    CREATE TABLE IF NOT EXISTS "{DUE_QUEUE_TABLE}" (
+        "tbl" TEXT NOT NULL,
+        "row_id" INTEGER NOT NULL,
+        "due_date" TEXT NOT NULL,
+        "notified" INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY ("tbl", "row_id")
+    );
+    ''')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS "_due_pending" ON "{DUE_QUEUE_TABLE}" ("due_date") WHERE notified = 0;')
+    for table, column in DEADLINE_COLUMNS.items():
+        installed = conn.execute("SELECT 1 FROM sqlite_master WHERE type='trigger' AND name = ?;",
+                                 (f"_due_{table}_I",)).fetchone() is not None
+        enqueue = f'''
+                INSERT OR REPLACE INTO "{DUE_QUEUE_TABLE}" ("tbl", "row_id", "due_date", "notified")
+                SELECT '{table}', NEW.id, {iso_date_sql(column, "NEW")}, 0
+                WHERE NEW."{column}" LIKE '__.__.____';'''
+        # UPDATE OF срабатывает и без изменения значения (формы обновляют все столбцы),
+        # поэтому срок заново ставится в очередь только при фактическом изменении.
+        # Триггер пересоздаётся, чтобы обновить его в ранее установленных базах.
+        conn.executescript(f'''
+            CREATE TRIGGER IF NOT EXISTS "_due_{table}_I" AFTER INSERT ON "{table}"
+            BEGIN{enqueue}
+            END;
+            DROP TRIGGER IF EXISTS "_due_{table}_U";
+            CREATE TRIGGER "_due_{table}_U" AFTER UPDATE OF "{column}", "id" ON "{table}"
+            WHEN OLD."{column}" IS NOT NEW."{column}" OR OLD.id IS NOT NEW.id
+            BEGIN
+                DELETE FROM "{DUE_QUEUE_TABLE}" WHERE "tbl" = '{table}' AND "row_id" = OLD.id;{enqueue}
+            END;
+            CREATE TRIGGER IF NOT EXISTS "_due_{table}_D" AFTER DELETE ON "{table}"
+            BEGIN
+                DELETE FROM "{DUE_QUEUE_TABLE}" WHERE "tbl" = '{table}' AND "row_id" = OLD.id;
+            END;
+        ''')
+        if installed:
+            continue
+        # Начальное заполнение очереди существующими строками; уже прошедшие сроки не показываются
+        conn.execute(f'''
+            INSERT OR IGNORE INTO "{DUE_QUEUE_TABLE}" ("tbl", "row_id", "due_date", "notified")
+            SELECT '{table}', id, {iso_date_sql(column)}, {iso_date_sql(column)} < date('now', 'localtime')
+            FROM "{table}" WHERE "{column}" LIKE '__.__.____';
+        ''')
+    conn.commit()
+
+class DeadlineScheduler:
+    """
+    Фоновая проверка истекающих отсрочек и приближающихся дат призыва.
+    Каждый проход выбирает из очереди только ещё не показанные сроки в пределах
+    lookahead_days и помечает их показанными; callback получает весь пакет сразу.
+    Очередь устанавливается (install_due_queue) при первом проходе, то есть в потоке,
+    который вызывает poll, а не при создании объекта.
+    """
+    def __init__(self, connection_params, lookahead_days=DUE_LOOKAHEAD_DAYS, batch_size=1000):
+        self.connection_params = connection_params
+        self.lookahead_days = lookahead_days
+        self.batch_size = batch_size
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._installed = False
+
+    def poll(self, today=None):
+        """
+        Новые сроки до today + lookahead_days: список
+        (таблица, id, дата ISO, id гражданина, ФИО) по возрастанию даты.
+        """
+        horizon = ((today or datetime.now().date()) + timedelta(days=self.lookahead_days)).isoformat()
+        conn = sqlite3.connect(**self.connection_params)
+        try:
+            if not self._installed:
+                install_due_queue(conn)
+                self._installed = True
+            with conn:
+                due = conn.execute(f'''
+                    SELECT "tbl", "row_id", "due_date" FROM "{DUE_QUEUE_TABLE}"
+                    WHERE notified = 0 AND due_date <= ? ORDER BY due_date LIMIT ?;
+                    ''', (horizon, self.batch_size)).fetchall()
+                conn.executemany(f'UPDATE "{DUE_QUEUE_TABLE}" SET notified = 1 WHERE "tbl" = ? AND "row_id" = ?;',
+                                 [(table, row_id) for table, row_id, _ in due])
+            items = []
+            for table, row_id, due_date in due:
+                citizen = conn.execute(f'''
+                    SELECT g.id, g.ФИО FROM "{table}" t LEFT JOIN "Граждане" g ON g.id = t."Гражданин_id"
+                    WHERE t.id = ?;''', (row_id,)).fetchone() or (None, None)
+                items.append((table, row_id, due_date) + tuple(citizen))
+            return items
+        finally:
+            conn.close()
+
+    def start(self, callback, interval=60):
+        """Проверка раз в interval секунд в фоновом потоке; callback(items) только для непустых пакетов."""
+        self._stop_event.clear()
+
+        def loop():
+            while not self._stop_event.is_set():
+                try:
+                    items = self.poll()
+                except sqlite3.Error:
+                    items = []
+                if items:
+                    callback(items)
+                self._stop_event.wait(interval)
+
+        self._thread = threading.Thread(target=loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+class SQLiteDialect:
+    """
+    Диалект SQLite для ServerBackend: локальный заменитель сервера, на котором
+    клиент-серверный путь (пул соединений, потоковые курсоры) проверяется без СУБД.
+    """
+    name = "sqlite"
+    Error = sqlite3.Error
+    row_key = "rowid"
+
+    def __init__(self, path):
+        self.path = path
+
+    def connect(self):
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+    def translate(self, query, params=()):
+        return query, params
+
+    def nulls_order(self, desc):
+        return ""
+
+    def like_operand(self, column):
+        return f'"{column}"'
+
+    def table_names(self, cursor):
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name;")
+        return [row[0] for row in cursor.fetchall() if not is_service_table(row[0])]
+
+    def columns(self, cursor, table_name):
+        """Столбцы таблицы: (имя, входит в первичный ключ, сравнивается как текст)."""
+        cursor.execute(f"PRAGMA table_info('{table_name}');")
+        return [(col[1], bool(col[5]), sqlite_text_affinity(col[2])) for col in cursor.fetchall()]
+
+    def stream_cursor(self, conn, chunk_size):
+        # SQLite и так выбирает строки по мере fetchmany
+        return conn.cursor()
+
+POSTGRES_NUMERIC_TYPES = {"smallint", "integer", "bigint", "numeric", "real", "double precision"}
+
+class PostgresDialect:
+    """
+    Диалект PostgreSQL (psycopg2): параметры %s, явный порядок NULL,
+    именованные (серверные) курсоры для потокового чтения.
+    """
+    name = "postgresql"
+    row_key = "ctid"
+
+    def __init__(self, dsn):
+        try:
+            import psycopg2
+        except ImportError:
+            raise RuntimeError("Для PostgreSQL нужен пакет psycopg2 (pip install psycopg2-binary)")
+        self.psycopg2 = psycopg2
+        self.Error = psycopg2.Error
+        self.dsn = dsn
+        self._cursor_ids = itertools.count()
+
+    def connect(self):
+        return self.psycopg2.connect(self.dsn)
+
+    def translate(self, query, params=()):
+        if not params:
+            return query, None
+        return query.replace("%", "%%").replace("?", "%s"), params
+
+    def nulls_order(self, desc):
+        # В PostgreSQL NULL при ASC идёт последним — приводим к порядку SQLite
+        return " NULLS LAST" if desc else " NULLS FIRST"
+
+    def like_operand(self, column):
+        # LIKE определён только для текста: для числовых столбцов (id, Гражданин_id) нужно приведение
+        return f'CAST("{column}" AS TEXT)'
+
+    def table_names(self, cursor):
+        cursor.execute("SELECT table_name FROM information_schema.tables "
+                       "WHERE table_schema = current_schema() AND table_type = 'BASE TABLE' "
+                       "ORDER BY table_name;")
+        return [row[0] for row in cursor.fetchall() if not is_service_table(row[0])]
+
+    def columns(self, cursor, table_name):
+        """
+        Столбцы таблицы: (имя, входит в первичный ключ, сравнивается как текст).
+        С числом сравниваются только числовые типы; для text, дат и прочих
+        параметр передаётся строкой и приводится к типу столбца сервером.
+        """
+        cursor.execute("""
+            SELECT c.column_name, tc.constraint_type IS NOT NULL, c.data_type
+            FROM information_schema.columns c
+            LEFT JOIN information_schema.key_column_usage k
+                ON k.table_schema = c.table_schema AND k.table_name = c.table_name
+                AND k.column_name = c.column_name
+            LEFT JOIN information_schema.table_constraints tc
+                ON tc.constraint_name = k.constraint_name AND tc.table_schema = k.table_schema
+                AND tc.constraint_type = 'PRIMARY KEY'
+            WHERE c.table_schema = current_schema() AND c.table_name = %s
+            ORDER BY c.ordinal_position;""", (table_name,))
+        primary, text = {}, {}
+        for name, is_primary, data_type in cursor.fetchall():
+            primary[name] = primary.get(name, False) or is_primary
+            text[name] = data_type not in POSTGRES_NUMERIC_TYPES
+        return [(name, is_primary, text[name]) for name, is_primary in primary.items()]
+
+    def stream_cursor(self, conn, chunk_size):
+        cursor = conn.cursor(name=f"pbz_stream_{next(self._cursor_ids)}")
+        cursor.itersize = chunk_size
+        return cursor
+
+class BackendCursor:
+    """Курсор DB-API, приводящий запросы с параметрами «?» к диалекту хранилища."""
+    def __init__(self, cursor, dialect):
+        self.cursor = cursor
+        self.dialect = dialect
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    def execute(self, query, params=()):
+        self.cursor.execute(*self.dialect.translate(query, params))
+        return self
+
+    def executemany(self, query, rows):
+        rows = list(rows)
+        if rows:
+            self.cursor.executemany(self.dialect.translate(query, rows[0])[0], rows)
+        return self
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchmany(self, size):
+        return self.cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+class ServerBackend(StorageBackend):
+    """
+    Клиент-серверная реализация StorageBackend. Соединения берутся из пула
+    (не больше pool_size, простаивающие переиспользуются), потоковое чтение
+    идёт через серверные курсоры диалекта. Сведения о столбцах кэшируются.
+    """
+    def __init__(self, dialect, location, pool_size=5, timeout=30):
+        super().__init__()
+        self.dialect = dialect.name
+        self.Error = dialect.Error
+        self._dialect = dialect
+        self.location = location
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._pool_lock = threading.Lock()
+        self._columns = {}
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._pool_lock:
+            if self._opened < self.pool_size:
+                self._opened += 1
+                try:
+                    return self._dialect.connect()
+                except Exception:
+                    self._opened -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise self.Error(f"Нет свободного соединения в пуле за {self.timeout} с (размер пула {self.pool_size})")
+
+    def _release(self, conn):
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Соединение из пула на время блока; незавершённая транзакция откатывается."""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                yield BackendCursor(cursor, self._dialect)
+                conn.commit()
+            finally:
+                cursor.close()
 
     def get_table_names(self):
-        self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        return [row[0] for row in self.cursor.fetchall()]
+        with self.connection() as conn:
+            return self._dialect.table_names(conn.cursor())
+
+    def _column_info(self, table_name):
+        if table_name not in self._columns:
+            with self.connection() as conn:
+                self._columns[table_name] = self._dialect.columns(conn.cursor(), table_name)
+        return self._columns[table_name]
+
+    def get_columns(self, table_name):
+        return [name for name, _, _ in self._column_info(table_name)]
+
+    def get_primary_key(self, table_name):
+        keys = [name for name, is_primary, _ in self._column_info(table_name) if is_primary]
+        return keys[0] if len(keys) == 1 else None
+
+    def text_columns(self, table_name):
+        return {name for name, _, is_text in self._column_info(table_name) if is_text}
+
+    def page_key(self, table_name):
+        key = self.get_primary_key(table_name)
+        return f'"{key}"' if key else self._dialect.row_key
+
+    def nulls_order(self, desc):
+        return self._dialect.nulls_order(desc)
+
+    def like_operand(self, column):
+        return self._dialect.like_operand(column)
 
     def execute(self, query, params=()):
         try:
-            self.cursor.execute(query, params)
-            self.conn.commit()
-        except sqlite3.Error as e:
+            with self.transaction() as cursor:
+                cursor.execute(query, params)
+        except self.Error as e:
             messagebox.showerror("Ошибка БД", f"Произошла ошибка: {e}")
             return False
+        if query.lstrip().upper().startswith(("ALTER", "DROP", "CREATE")):
+            self._columns.clear()
         return True
 
     def fetchall(self, query, params=()):
-        self.cursor.execute(query, params)
-        return self.cursor.fetchall()
+        with self.connection() as conn:
+            return BackendCursor(conn.cursor(), self._dialect).execute(query, params).fetchall()
 
     def fetchone(self, query, params=()):
-        self.cursor.execute(query, params)
-        return self.cursor.fetchone()
+        with self.connection() as conn:
+            return BackendCursor(conn.cursor(), self._dialect).execute(query, params).fetchone()
+
+    def iterate(self, query, params=(), chunk_size=1000):
+        """Потоковое чтение через серверный курсор; соединение занято, пока генератор не исчерпан."""
+        with self.connection() as conn:
+            cursor = self._dialect.stream_cursor(conn, chunk_size)
+            try:
+                cursor.execute(*self._dialect.translate(query, params))
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield from rows
+            finally:
+                cursor.close()
 
     def close(self):
-        self.conn.close()
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        self._opened = 0
+
+def sqlite_url_path(url):
+    """Путь к файлу из адреса вида sqlite:///путь (четыре косые черты — абсолютный путь)."""
+    path = url.partition("://")[2]
+    return path[1:] if path.startswith("/") else path
+
+def open_backend(url, pool_size=5, **db_options):
+    """
+    Хранилище по адресу:
+    sqlite:///путь — DatabaseManager (db_options передаются ему);
+    standin:///путь — ServerBackend над SQLite, локальный заменитель сервера;
+    shard:///каталог — ShardedDatabase (шарды, созданные командой shard create);
+    postgresql://... — ServerBackend над PostgreSQL (нужен psycopg2).
+    """
+    scheme = url.partition("://")[0]
+    if scheme == "sqlite":
+        return DatabaseManager({"database": sqlite_url_path(url)}, **db_options)
+    if scheme == "shard":
+        return ShardedDatabase(sqlite_url_path(url))
+    if scheme == "standin":
+        path = sqlite_url_path(url)
+        return ServerBackend(SQLiteDialect(path), path, pool_size=pool_size)
+    if scheme in ("postgres", "postgresql"):
+        return ServerBackend(PostgresDialect(url), url.rpartition("@")[2], pool_size=pool_size)
+    raise ValueError(f"Неизвестный тип хранилища: {url}")
+
+CONFORMANCE_TABLE = "conformance_check"
+# Служебная таблица (имя с «_»), которой не должно быть в get_table_names
+CONFORMANCE_SERVICE_TABLE = "_conformance_service"
+CONFORMANCE_COLUMNS = ("id", "Имя", "Значение", "Дата", "Год")
+
+def conformance_rows(count):
+    """
+    Детерминированные строки для проверки: каждое десятое Значение — NULL,
+    Год — текстовый столбец с числами (как Дата_призыва и номера документов).
+    """
+    start = datetime(2020, 1, 1)
+    for i in range(1, count + 1):
+        yield (i, f"Гражданин {i % 97}", None if i % 10 == 0 else i * 7919 % 1000,
+               (start + timedelta(days=i % 1500)).strftime("%Y-%m-%d"), str(2000 + i % 40))
+
+def treeview_values(row):
+    """Значения строки в том виде, в каком их возвращает Treeview: текст из цифр становится числом."""
+    return [int(value) if isinstance(value, str) and value.isdigit() else value for value in row]
+
+def run_conformance(backend, rows=10000, batch_size=1000, page_size=PAGE_SIZE):
+    """
+    Общий набор проверок совместимости и производительности для реализаций StorageBackend.
+    Создаёт таблицу CONFORMANCE_TABLE, проверяет список таблиц, интроспекцию, пакетную вставку,
+    откат транзакции, постраничное чтение с сортировкой, NULL и фильтрами, изменение
+    и удаление строк и потоковое чтение, затем удаляет таблицу.
+    Возвращает список (проверка, успешно, секунды, подробности).
+
+    Локальный заменитель (standin://) проверяет пул и курсоры ServerBackend, но не диалект
+    PostgreSQL: перевод параметров, NULLS FIRST/LAST, интроспекция через information_schema,
+    именованные курсоры и постраничная выборка по ctid проверяются только при запуске
+    против адреса postgresql://.
+    """
+    table = CONFORMANCE_TABLE
+    data = list(conformance_rows(rows))
+    by_id = {row[0]: row for row in data}
+    results = []
+
+    def check(name, func):
+        started = time.perf_counter()
+        try:
+            ok, detail = func()
+        except backend.Error as e:
+            ok, detail = False, f"ошибка: {e}"
+        results.append((name, ok, time.perf_counter() - started, detail))
+        return ok
+
+    def read_all(sort, desc, filters=None):
+        ids, after = [], None
+        while True:
+            page = backend.fetch_page(table, sort=sort, desc=desc, filters=filters, after=after, limit=page_size)
+            ids.extend(row[0] for _, row in page)
+            if len(page) < page_size:
+                return ids
+            after = page[-1][0]
+
+    def expected_order(sort, desc, predicate=lambda row: True):
+        selected = [row for row in by_id.values() if predicate(row)]
+        if sort is None:
+            return sorted((row[0] for row in selected), reverse=desc)
+        index = CONFORMANCE_COLUMNS.index(sort)
+        # Порядок SQLite: NULL меньше любого значения
+        selected.sort(key=lambda row: (row[index] is not None, row[index], row[0]), reverse=desc)
+        return [row[0] for row in selected]
+
+    def table_list():
+        tables = backend.get_table_names()
+        service = [name for name in tables if is_service_table(name)]
+        ok = table in tables and not service and tables == sorted(tables)
+        return ok, f"{len(tables)} таблиц" + (f", служебные: {service}" if service else "") + \
+            ("" if tables == sorted(tables) else ", не по алфавиту")
+
+    def introspection():
+        tables = backend.get_table_names()
+        columns = backend.get_columns(table)
+        key = backend.get_primary_key(table)
+        ok = table in tables and tuple(columns) == CONFORMANCE_COLUMNS and key == "id"
+        return ok, f"столбцы {columns}, ключ {key}"
+
+    def bulk_insert():
+        inserted = backend.insert_rows(table, CONFORMANCE_COLUMNS, data, batch_size=batch_size)
+        count = backend.count_rows(table)
+        return inserted == count == rows, f"{count} строк"
+
+    def rollback():
+        try:
+            with backend.transaction() as cursor:
+                cursor.execute(f'DELETE FROM "{table}";')
+                raise KeyError("откат")
+        except KeyError:
+            pass
+        count = backend.count_rows(table)
+        return count == rows, f"после отката {count} строк"
+
+    def paging():
+        failed = []
+        for sort, desc in ((None, False), (None, True), ("Значение", False), ("Значение", True)):
+            if read_all(sort, desc) != expected_order(sort, desc):
+                failed.append(f"{sort or 'ключ'} {'DESC' if desc else 'ASC'}")
+        pages = (rows + page_size - 1) // page_size
+        return not failed, f"расхождения: {', '.join(failed)}" if failed else f"4 прохода по {pages} стр."
+
+    def filtering():
+        ids = read_all("Значение", False, {"Значение": ">=500", "Имя": "Гражданин 1"})
+        expected = expected_order("Значение", False, lambda row: row[2] is not None and row[2] >= 500
+                                  and "Гражданин 1" in row[1])
+        # Число в фильтре текстового столбца сравнивается как текст
+        years = read_all("Год", True, {"Год": ">2020"})
+        expected_years = expected_order("Год", True, lambda row: row[4] > "2020")
+        return ids == expected and years == expected_years, f"{len(ids)} и {len(years)} строк"
+
+    def update_delete():
+        # Строка передаётся так, как её отдаёт интерфейс: Год и id — числами
+        old = treeview_values(by_id[1])
+        new = (old[0], "Изменённый", old[2], old[3], old[4])
+        updated = backend.update_row(table, CONFORMANCE_COLUMNS, new, old)
+        row = backend.fetchone(f'SELECT "Имя" FROM "{table}" WHERE "id" = ?;', (1,))
+        deleted = backend.delete_row(table, CONFORMANCE_COLUMNS, new)
+        count = backend.count_rows(table)
+        ok = updated and deleted and row is not None and row[0] == "Изменённый" and count == rows - 1
+        return ok, f"после удаления {count} строк"
+
+    def streaming():
+        count = sum(1 for _ in backend.iterate(f'SELECT * FROM "{table}";', chunk_size=batch_size))
+        return count == rows - 1, f"{count} строк порциями по {batch_size}"
+
+    with backend.transaction() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS "{table}";')
+        cursor.execute(f'CREATE TABLE "{table}" ("id" INTEGER PRIMARY KEY, "Имя" TEXT, '
+                       f'"Значение" INTEGER, "Дата" TEXT, "Год" TEXT);')
+        cursor.execute(f'CREATE INDEX "{table}_Значение" ON "{table}" ("Значение");')
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS "{CONFORMANCE_SERVICE_TABLE}" ("id" INTEGER);')
+    try:
+        check("Список таблиц", table_list)
+        if check("Интроспекция", introspection) and check("Пакетная вставка", bulk_insert):
+            check("Откат транзакции", rollback)
+            check("Постраничное чтение", paging)
+            check("Фильтры", filtering)
+            check("Изменение и удаление", update_delete)
+            check("Потоковое чтение", streaming)
+    finally:
+        with backend.transaction() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS "{table}";')
+            cursor.execute(f'DROP TABLE IF EXISTS "{CONFORMANCE_SERVICE_TABLE}";')
+    return results
 
 class DatabaseApp:
     """
     Основной класс приложения. Отвечает за интерфейс, 
     работу с виджетами и взаимодействие с базой данных через DatabaseManager.
+
+    Вместо DatabaseManager можно передать другое хранилище (backend, см. StorageBackend).
+    Резервное копирование, профилирование, консоль SQL, поиск дубликатов и контроль
+    сроков работают напрямую с файлом SQLite и включаются только для DatabaseManager.
     """
-    def __init__(self, master, connection_params):
+    def __init__(self, master, connection_params, backend=None, **db_options):
         self.master = master
         self.master.title("Военкомат")
         self.master.configure(bg="#f0f0f0")
-        self.db = DatabaseManager(connection_params)
+        self.db = backend or DatabaseManager(connection_params, **db_options)
+        self.sqlite_tools = isinstance(self.db, DatabaseManager)
 
         self.setup_styles()
         self.create_header()
         self.create_report_button()
+        if self.sqlite_tools:
+            self.create_backup_controls()
 
         self.notebook = ttk.Notebook(master)
         self.notebook.pack(expand=True, fill='both', padx=10, pady=10)
 
+        self.view_state = {}
+        self.columns_cache = {}
+        self.row_forms = {}
+        self.dialog_timings = {}
         self.table_names = self.db.get_table_names()
         for table_name in self.table_names:
             frame = tk.Frame(self.notebook, bg="#f0f0f0")
             self.notebook.add(frame, text=table_name)
             self.create_table_view(frame, table_name)
+        if self.sqlite_tools:
+            self.create_console_tab()
+            self.start_deadline_scheduler()
 
     def setup_styles(self):
         """Настройка стилей для виджетов приложения."""
@@ -85,18 +2674,119 @@ class DatabaseApp:
         """Создание кнопки формирования отчёта."""
         report_button = ttk.Button(self.master, text="Создать отчёт", command=self.generate_report)
         report_button.pack(side=tk.TOP, padx=10, pady=5)
+        self.profiler = None
+        self.profile_events = queue.Queue()
+        if self.sqlite_tools:
+            self.profile_button = ttk.Button(self.master, text="Профиль данных", command=self.run_profile)
+            self.profile_button.pack(side=tk.TOP, padx=10, pady=(0, 5))
+
+    def create_backup_controls(self):
+        """Кнопка резервного копирования и строка состояния с прогрессом."""
+        self.backup_manager = BackupManager(self.db.connection_params)
+        self.backup_events = queue.Queue()
+        backup_frame = tk.Frame(self.master, bg="#f0f0f0")
+        backup_frame.pack(side=tk.TOP, pady=(0, 5))
+        self.backup_button = ttk.Button(backup_frame, text="Резервная копия", command=self.run_backup)
+        self.backup_button.pack(side=tk.LEFT, padx=5)
+        self.backup_status = ttk.Label(backup_frame, text="")
+        self.backup_status.pack(side=tk.LEFT, padx=5)
+
+    def run_backup(self):
+        """
+        Запуск резервного копирования в фоновом потоке. События прогресса
+        передаются через очередь и обрабатываются в главном потоке Tk.
+        """
+        self.backup_button.state(["disabled"])
+        self.backup_manager.start_backup(
+            progress=lambda copied, total: self.backup_events.put(("progress", copied, total)),
+            done=lambda path, error: self.backup_events.put(("done", path, error)))
+        self.master.after(100, self.poll_backup_events)
+
+    def poll_backup_events(self):
+        while True:
+            try:
+                event = self.backup_events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == "progress":
+                _, copied, total = event
+                percent = copied * 100 // total if total else 100
+                self.backup_status.config(text=f"Копирование: {percent}% ({copied}/{total} стр.)")
+            else:
+                _, path, error = event
+                self.backup_button.state(["!disabled"])
+                if error:
+                    self.backup_status.config(text="")
+                    messagebox.showerror("Ошибка резервного копирования", str(error))
+                else:
+                    self.backup_status.config(text=f"Снимок сохранён: {path}")
+                return
+        self.master.after(100, self.poll_backup_events)
+
+    def start_deadline_scheduler(self, interval=60):
+        """Фоновая проверка сроков отсрочек и призыва; уведомления показываются пакетом."""
+        self.deadline_events = queue.Queue()
+        self.deadline_scheduler = DeadlineScheduler(self.db.connection_params)
+        self.deadline_scheduler.start(self.deadline_events.put, interval=interval)
+        self.master.after(1000, self.poll_deadline_events)
+
+    def poll_deadline_events(self):
+        items = []
+        while True:
+            try:
+                items.extend(self.deadline_events.get_nowait())
+            except queue.Empty:
+                break
+        if items:
+            self.show_deadlines(items)
+        self.master.after(1000, self.poll_deadline_events)
+
+    def show_deadlines(self, items):
+        """Окно со списком приближающихся сроков."""
+        window = tk.Toplevel(self.master)
+        window.title(f"Приближающиеся сроки ({len(items)})")
+        window.configure(bg="#f0f0f0")
+        columns = ("Таблица", "id", "Срок", "Гражданин")
+        deadlines_tree = ttk.Treeview(window, columns=columns, show='headings')
+        for col in columns:
+            deadlines_tree.heading(col, text=col)
+            deadlines_tree.column(col, width=220 if col == "Гражданин" else 100, anchor='center')
+        deadlines_tree.pack(expand=True, fill='both', padx=10, pady=10)
+        for table, row_id, due_date, citizen_id, fio in items:
+            due_date = datetime.strptime(due_date, "%Y-%m-%d").strftime("%d.%m.%Y")
+            citizen = f"{citizen_id}: {fio}" if citizen_id else ""
+            deadlines_tree.insert('', 'end', values=(table, row_id, due_date, citizen))
+        ttk.Button(window, text="Закрыть", command=window.destroy).pack(pady=5)
 
     def create_table_view(self, frame, table_name):
         """
         Создает представление для таблицы базы данных, включая Treeview
         и кнопки для действий (добавить, удалить, изменить, обновить).
         """
-        columns_info = self.db.fetchall(f"PRAGMA table_info('{table_name}');")
-        columns = [col[1] for col in columns_info]
-        tree = ttk.Treeview(frame, columns=columns, show='headings', selectmode='browse')
-        tree.pack(expand=True, fill='both', padx=5, pady=5)
+        columns = self.get_table_columns(table_name)
+        self.view_state[table_name] = {"columns": columns, "sort": None, "desc": False, "filters": {},
+                                       "after": None, "exhausted": False, "loading": False}
+
+        # Строка фильтров: по одному полю на столбец, применяется по Enter
+        filter_frame = tk.Frame(frame, bg="#f0f0f0")
+        filter_frame.pack(fill=tk.X, padx=5, pady=(5, 0))
+        filter_entries = {}
+        for i, col in enumerate(columns):
+            entry = ttk.Entry(filter_frame, width=12)
+            entry.grid(row=0, column=i, padx=1, sticky='ew')
+            entry.bind("<Return>", lambda e: self.apply_filters(tree, table_name, filter_entries))
+            filter_frame.columnconfigure(i, weight=1)
+            filter_entries[col] = entry
+
+        tree_frame = tk.Frame(frame)
+        tree_frame.pack(expand=True, fill='both', padx=5, pady=5)
+        tree = ttk.Treeview(tree_frame, columns=columns, show='headings', selectmode='browse')
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=lambda first, last: self.on_tree_scroll(tree, table_name, scrollbar, first, last))
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(expand=True, fill='both')
         for col in columns:
-            tree.heading(col, text=col)
+            tree.heading(col, text=col, command=lambda c=col: self.sort_by(tree, table_name, c))
             tree.column(col, width=100, anchor='center')
         self.populate_treeview(tree, table_name)
 
@@ -110,13 +2800,271 @@ class DatabaseApp:
                    command=lambda: self.open_row_dialog(tree, table_name, mode="edit")).grid(row=0, column=2, padx=5)
         ttk.Button(btn_frame, text="Обновить",
                    command=lambda: self.populate_treeview(tree, table_name)).grid(row=0, column=3, padx=5)
+        if table_name == "Граждане" and self.sqlite_tools:
+            ttk.Button(btn_frame, text="Поиск дубликатов",
+                       command=lambda: self.find_duplicates(tree, table_name)).grid(row=0, column=4, padx=5)
 
     def populate_treeview(self, tree, table_name):
-        """Заполнение Treeview данными из таблицы."""
-        data = self.db.fetchall(f"SELECT * FROM '{table_name}';")
+        """Заполнение Treeview первой страницей данных с текущими сортировкой и фильтрами."""
+        state = self.view_state[table_name]
+        state["after"] = None
+        state["exhausted"] = False
         tree.delete(*tree.get_children())
-        for row in data:
+        self.load_next_page(tree, table_name)
+
+    def load_next_page(self, tree, table_name):
+        """Догрузка следующей страницы (PAGE_SIZE строк) в конец Treeview."""
+        state = self.view_state[table_name]
+        if state["exhausted"]:
+            return
+        page = self.db.fetch_page(table_name, sort=state["sort"], desc=state["desc"],
+                                  filters=state["filters"], after=state["after"])
+        for key, row in page:
             tree.insert('', 'end', values=row)
+        if page:
+            state["after"] = page[-1][0]
+        state["exhausted"] = len(page) < PAGE_SIZE
+
+    def on_tree_scroll(self, tree, table_name, scrollbar, first, last):
+        """При прокрутке к концу списка догружается следующая страница."""
+        scrollbar.set(first, last)
+        state = self.view_state[table_name]
+        if float(last) >= 0.98 and not state["exhausted"] and not state["loading"]:
+            state["loading"] = True
+
+            def load():
+                self.load_next_page(tree, table_name)
+                state["loading"] = False
+
+            self.master.after_idle(load)
+
+    def sort_by(self, tree, table_name, column):
+        """Сортировка по щелчку на заголовке: повторный щелчок меняет направление."""
+        state = self.view_state[table_name]
+        if state["sort"] == column:
+            state["desc"] = not state["desc"]
+        else:
+            state["sort"], state["desc"] = column, False
+        self.db.ensure_sort_index(table_name, column)
+        for col in state["columns"]:
+            arrow = (" ▼" if state["desc"] else " ▲") if col == column else ""
+            tree.heading(col, text=col + arrow)
+        self.populate_treeview(tree, table_name)
+
+    def apply_filters(self, tree, table_name, filter_entries):
+        self.view_state[table_name]["filters"] = {col: entry.get() for col, entry in filter_entries.items()}
+        self.populate_treeview(tree, table_name)
+
+    def create_console_tab(self):
+        """Вкладка «Консоль SQL»: произвольный запрос, план выполнения, время и история."""
+        frame = tk.Frame(self.notebook, bg="#f0f0f0")
+        self.notebook.add(frame, text="Консоль SQL")
+        self.console_job = None
+        self.console_running = False
+        self.console_rows = []
+        self.console_events = queue.Queue()
+        self.console_history = []
+
+        paned = ttk.PanedWindow(frame, orient=tk.HORIZONTAL)
+        paned.pack(expand=True, fill='both', padx=5, pady=5)
+        main = tk.Frame(paned, bg="#f0f0f0")
+        history_frame = tk.Frame(paned, bg="#f0f0f0")
+        paned.add(main, weight=4)
+        paned.add(history_frame, weight=1)
+
+        self.console_input = tk.Text(main, height=6, font=("Courier New", 10))
+        self.console_input.pack(fill=tk.X)
+        self.console_input.bind("<Control-Return>", lambda e: (self.run_console_query(), "break")[1])
+
+        controls = tk.Frame(main, bg="#f0f0f0")
+        controls.pack(fill=tk.X, pady=5)
+        self.console_run_button = ttk.Button(controls, text="Выполнить", command=self.run_console_query)
+        self.console_run_button.pack(side=tk.LEFT, padx=5)
+        self.console_cancel_button = ttk.Button(controls, text="Отмена", command=self.cancel_console_query)
+        self.console_cancel_button.pack(side=tk.LEFT, padx=5)
+        self.console_cancel_button.state(["disabled"])
+        self.console_status = ttk.Label(controls, text="")
+        self.console_status.pack(side=tk.LEFT, padx=5)
+
+        result_frame = tk.Frame(main)
+        result_frame.pack(expand=True, fill='both')
+        self.console_tree = ttk.Treeview(result_frame, show='headings')
+        scrollbar = ttk.Scrollbar(result_frame, orient=tk.VERTICAL, command=self.console_tree.yview)
+        self.console_tree.configure(yscrollcommand=lambda first, last: self.on_console_scroll(scrollbar, first, last))
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.console_tree.pack(expand=True, fill='both')
+
+        ttk.Label(main, text="План выполнения:").pack(anchor='w')
+        self.console_plan = tk.Text(main, height=4, font=("Courier New", 9), state="disabled")
+        self.console_plan.pack(fill=tk.X)
+
+        ttk.Label(history_frame, text="История:").pack(anchor='w')
+        self.console_history_list = tk.Listbox(history_frame)
+        self.console_history_list.pack(expand=True, fill='both')
+        self.console_history_list.bind("<Double-Button-1>", self.load_console_history)
+
+    def run_console_query(self):
+        query = self.console_input.get("1.0", tk.END).strip()
+        if not query or self.console_running:
+            return
+        if query in self.console_history:
+            self.console_history.remove(query)
+        self.console_history.insert(0, query)
+        self.console_history_list.delete(0, tk.END)
+        for item in self.console_history:
+            self.console_history_list.insert(tk.END, " ".join(item.split()))
+
+        self.console_plan.config(state="normal")
+        self.console_plan.delete("1.0", tk.END)
+        try:
+            self.console_plan.insert("1.0", "\n".join(self.db.explain(query)))
+        except sqlite3.Error as e:
+            self.console_plan.insert("1.0", f"План недоступен: {e}")
+        self.console_plan.config(state="disabled")
+
+        self.console_rows = []
+        self.console_tree.delete(*self.console_tree.get_children())
+        self.console_tree["columns"] = ()
+        self.console_status.config(text="Выполняется...")
+        self.console_run_button.state(["disabled"])
+        self.console_cancel_button.state(["!disabled"])
+        self.console_job = self.db.run_console_query(
+            query,
+            on_batch=lambda columns, rows: self.console_events.put(("batch", columns, rows)),
+            on_done=lambda elapsed, count, error, cached: self.console_events.put(
+                ("done", elapsed, count, error, cached)))
+        self.console_running = True
+        self.master.after(50, self.poll_console_events)
+
+    def cancel_console_query(self):
+        if self.console_job is not None:
+            self.console_job.cancel()
+
+    def poll_console_events(self):
+        """Перенос результатов из фонового потока в таблицу по мере поступления порций."""
+        while True:
+            try:
+                event = self.console_events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == "batch":
+                _, columns, rows = event
+                if not self.console_tree["columns"]:
+                    self.console_tree["columns"] = columns
+                    for col in columns:
+                        self.console_tree.heading(col, text=col)
+                        self.console_tree.column(col, width=100, anchor='center')
+                self.console_rows.extend(rows)
+                if len(self.console_tree.get_children()) < PAGE_SIZE:
+                    self.show_console_rows()
+                self.console_status.config(text=f"Получено строк: {len(self.console_rows)}...")
+            else:
+                _, elapsed, count, error, cached = event
+                self.console_job = None
+                self.console_running = False
+                self.console_run_button.state(["!disabled"])
+                self.console_cancel_button.state(["disabled"])
+                if error:
+                    self.console_status.config(text=f"Ошибка: {error} ({elapsed:.3f} с)")
+                elif cached:
+                    self.console_status.config(text=f"Строк: {count} (из кэша)")
+                else:
+                    self.console_status.config(text=f"Строк: {count}, время: {elapsed:.3f} с")
+                return
+        self.master.after(50, self.poll_console_events)
+
+    def show_console_rows(self):
+        """Показ следующей порции строк: в Treeview попадает только прокрученная часть результата."""
+        shown = len(self.console_tree.get_children())
+        for row in self.console_rows[shown:shown + PAGE_SIZE]:
+            self.console_tree.insert('', 'end', values=row)
+
+    def on_console_scroll(self, scrollbar, first, last):
+        scrollbar.set(first, last)
+        if float(last) >= 0.98 and len(self.console_tree.get_children()) < len(self.console_rows):
+            self.master.after_idle(self.show_console_rows)
+
+    def load_console_history(self, event):
+        selection = self.console_history_list.curselection()
+        if selection:
+            self.console_input.delete("1.0", tk.END)
+            self.console_input.insert("1.0", self.console_history[selection[0]])
+
+    def find_duplicates(self, tree, table_name):
+        """Поиск дубликатов граждан в фоне и окно с предложениями на объединение."""
+        deduplicator = CitizenDeduplicator(self.db.connection_params, archive_path=self.db.archive_path)
+        window = tk.Toplevel(self.master)
+        window.title("Дубликаты граждан")
+        window.configure(bg="#f0f0f0")
+        status = ttk.Label(window, text="Поиск дубликатов...")
+        status.pack(anchor='w', padx=10, pady=5)
+        columns = ("id1", "ФИО 1", "id2", "ФИО 2", "Оценка")
+        suggestions_tree = ttk.Treeview(window, columns=columns, show='headings', selectmode='browse')
+        for col in columns:
+            suggestions_tree.heading(col, text=col)
+            suggestions_tree.column(col, width=200 if col.startswith("ФИО") else 70, anchor='center')
+        suggestions_tree.pack(expand=True, fill='both', padx=10, pady=5)
+        events = queue.Queue()
+
+        def worker():
+            try:
+                events.put((deduplicator.find_duplicates(), None))
+            except (sqlite3.Error, OSError) as e:
+                events.put((None, e))
+
+        # Пар может быть десятки тысяч — в таблицу они добавляются страницами по PAGE_SIZE
+        state = {"found": [], "shown": 0}
+        more_button = ttk.Button(window, text="Показать ещё", state='disabled')
+
+        def show_page():
+            page = state["found"][state["shown"]:state["shown"] + PAGE_SIZE]
+            for values in page:
+                suggestions_tree.insert('', 'end', values=values)
+            state["shown"] += len(page)
+            status.config(text=f"Найдено пар: {len(state['found'])}, показано: {state['shown']}")
+            more_button.config(state='normal' if state["shown"] < len(state["found"]) else 'disabled')
+
+        def poll():
+            try:
+                suggestions, error = events.get_nowait()
+            except queue.Empty:
+                window.after(100, poll)
+                return
+            if error:
+                status.config(text=f"Ошибка: {error}")
+                return
+            state["found"] = suggestions
+            show_page()
+
+        def merge_selected():
+            selected = suggestions_tree.selection()
+            if not selected:
+                messagebox.showwarning("Предупреждение", "Пожалуйста, выберите пару для объединения.", parent=window)
+                return
+            keep_id, keep_name, duplicate_id, duplicate_name, _ = suggestions_tree.item(selected)['values']
+            if not messagebox.askyesno("Подтверждение",
+                                       f"Объединить «{duplicate_name}» ({duplicate_id}) с «{keep_name}» ({keep_id})?",
+                                       parent=window):
+                return
+            try:
+                deduplicator.merge(keep_id, duplicate_id)
+            except sqlite3.Error as e:
+                messagebox.showerror("Ошибка БД", f"Произошла ошибка: {e}", parent=window)
+                return
+            # Пары с удалённой записью больше не актуальны
+            for item in suggestions_tree.get_children():
+                values = suggestions_tree.item(item)['values']
+                if duplicate_id in (values[0], values[2]):
+                    suggestions_tree.delete(item)
+            state["found"][state["shown"]:] = [values for values in state["found"][state["shown"]:]
+                                               if duplicate_id not in (values[0], values[2])]
+            self.populate_treeview(tree, table_name)
+
+        more_button.config(command=show_page)
+        ttk.Button(window, text="Объединить", command=merge_selected).pack(pady=5)
+        more_button.pack(pady=5)
+        threading.Thread(target=worker, daemon=True).start()
+        window.after(100, poll)
 
     def validate_and_transform(self, table_name, columns, values):
         """
@@ -133,7 +3081,7 @@ class DatabaseApp:
                     messagebox.showerror("Ошибка", "Номер телефона должен содержать 12 цифр.")
                     return None
                 new_values[index] = f"+{phone_digits[0:3]}-{phone_digits[3:5]}-{phone_digits[5:8]}-{phone_digits[8:10]}-{phone_digits[10:12]}"
-        elif table_name in ("Призывники", "Документы", "Отсрочки"):
+        elif table_name in DEPENDENT_TABLES:
             if "Гражданин_id" in columns:
                 index = columns.index("Гражданин_id")
                 citizen_val = new_values[index]
@@ -147,11 +3095,26 @@ class DatabaseApp:
                     return None
         return new_values
 
+    def get_table_columns(self, table_name):
+        """Имена столбцов таблицы (кэшируются на время работы приложения)."""
+        if table_name not in self.columns_cache:
+            self.columns_cache[table_name] = self.db.get_columns(table_name)
+        return self.columns_cache[table_name]
+
     def open_row_dialog(self, tree, table_name, mode="add"):
         """
         Универсальный диалог для добавления/редактирования записи.
         Если mode == "edit", предварительно заполняются текущие данные выбранной строки.
+        Форма для каждой таблицы создается один раз и затем только показывается
+        и заполняется заново; время до готовности формы сохраняется в dialog_timings.
         """
+        started = time.perf_counter()
+        form = self.row_forms.get(table_name)
+        if form is not None and form["dialog"].state() != "withdrawn":
+            # Форма уже открыта: показываем её как есть, чтобы не потерять несохранённый ввод
+            form["dialog"].deiconify()
+            form["dialog"].lift()
+            return
         is_edit = (mode == "edit")
         if is_edit:
             selected = tree.selection()
@@ -162,72 +3125,79 @@ class DatabaseApp:
         else:
             current_values = None
 
-        columns_info = self.db.fetchall(f"PRAGMA table_info('{table_name}');")
-        columns = [col[1] for col in columns_info]
+        form = form or self.build_row_form(table_name)
+        form.update(tree=tree, is_edit=is_edit, current_values=current_values)
+        dialog = form["dialog"]
+        dialog.title("Изменить строку" if is_edit else "Добавить строку")
+        self.fill_row_form(form)
+        dialog.deiconify()
+        dialog.lift()
+        form["widgets"][0][1].focus_set()
+        dialog.after_idle(lambda: self.dialog_timings.setdefault(table_name, []).append(
+            time.perf_counter() - started))
 
+    def build_row_form(self, table_name):
+        """Создание скрытой формы для таблицы; при закрытии форма скрывается, а не уничтожается."""
+        columns = self.get_table_columns(table_name)
         dialog = tk.Toplevel(self.master)
-        dialog.title("Изменить строку" if is_edit else "Добавить строку")
+        dialog.withdraw()
         dialog.configure(bg="#f0f0f0")
+        dialog.protocol("WM_DELETE_WINDOW", dialog.withdraw)
 
-        entry_widgets = []
+        widgets = []
         for i, col in enumerate(columns):
             ttk.Label(dialog, text=col).grid(row=i, column=0, padx=10, pady=5, sticky='e')
-            widget = None
             # Для полей, связанных с гражданами, используем комбобокс
-            if table_name in ("Призывники", "Документы", "Отсрочки") and col == "Гражданин_id":
-                citizens = self.db.fetchall("SELECT id, ФИО FROM 'Граждане';")
-                citizen_values = [f"{c[0]}: {c[1]}" for c in citizens]
-                widget = ttk.Combobox(dialog, state="readonly", values=citizen_values)
-                if is_edit and current_values:
-                    try:
-                        citizen_name = self.db.fetchone("SELECT ФИО FROM 'Граждане' WHERE id = ?;", (current_values[i],))[0]
-                        widget.set(f"{current_values[i]}: {citizen_name}")
-                    except Exception:
-                        widget.set(str(current_values[i]))
-            elif table_name == "Граждане" and col == "Дата_рождения":
-                widget = DateEntry(dialog, date_pattern='dd.mm.yyyy')
-                if is_edit and current_values:
-                    widget.set_date(current_values[i])
-            elif table_name == "Призывники" and col == "Дата_призыва":
-                widget = DateEntry(dialog, date_pattern='dd.mm.yyyy')
-                if is_edit and current_values:
-                    widget.set_date(current_values[i])
-            elif table_name == "Документы" and col == "Дата_выдачи":
-                widget = DateEntry(dialog, date_pattern='dd.mm.yyyy')
-                if is_edit and current_values:
-                    widget.set_date(current_values[i])
-            elif table_name == "Отсрочки" and col in ("Дата_выдачи", "Срок_действия"):
-                widget = DateEntry(dialog, date_pattern='dd.mm.yyyy')
-                if is_edit and current_values:
-                    widget.set_date(current_values[i])
+            if table_name in DEPENDENT_TABLES and col == "Гражданин_id":
+                kind, widget = "citizen", ttk.Combobox(dialog, state="readonly")
+            elif col in DATE_COLUMNS.get(table_name, ()):
+                kind, widget = "date", DateEntry(dialog, date_pattern='dd.mm.yyyy')
             else:
-                widget = ttk.Entry(dialog)
-                if is_edit and current_values:
-                    widget.insert(0, current_values[i])
+                kind, widget = "entry", ttk.Entry(dialog)
             widget.grid(row=i, column=1, padx=10, pady=5, sticky='w')
-            entry_widgets.append(widget)
+            widgets.append((kind, widget))
 
-        def on_submit():
-            new_values = [w.get() for w in entry_widgets]
-            validated = self.validate_and_transform(table_name, columns, new_values)
-            if validated is None:
-                return
-            if is_edit:
-                # Формирование запроса для обновления записи
-                set_clause = ', '.join([f"{col} = ?" for col in columns])
-                where_clause = ' AND '.join([f"{col} = ?" for col in columns])
-                query = f"UPDATE '{table_name}' SET {set_clause} WHERE {where_clause};"
-                if self.db.execute(query, validated + current_values):
-                    self.populate_treeview(tree, table_name)
-                    dialog.destroy()
+        form = {"table_name": table_name, "dialog": dialog, "columns": columns, "widgets": widgets}
+        ttk.Button(dialog, text="Подтвердить",
+                   command=lambda: self.submit_row_form(form)).grid(row=len(columns), columnspan=2, pady=10)
+        self.row_forms[table_name] = form
+        return form
+
+    def fill_row_form(self, form):
+        """Сброс полей формы (добавление) или заполнение текущими значениями (редактирование)."""
+        current_values = form["current_values"]
+        for i, (kind, widget) in enumerate(form["widgets"]):
+            value = current_values[i] if form["is_edit"] and current_values else None
+            if kind == "citizen":
+                citizens = self.db.fetchall('SELECT "id", "ФИО" FROM "Граждане";')
+                widget["values"] = [f"{c[0]}: {c[1]}" for c in citizens]
+                widget.set("")
+                if value is not None:
+                    try:
+                        citizen_name = self.db.fetchone('SELECT "ФИО" FROM "Граждане" WHERE "id" = ?;', (value,))[0]
+                        widget.set(f"{value}: {citizen_name}")
+                    except Exception:
+                        widget.set(str(value))
+            elif kind == "date":
+                widget.set_date(value if value is not None else datetime.now().date())
             else:
-                placeholders = ', '.join(['?' for _ in validated])
-                query = f"INSERT INTO '{table_name}' VALUES ({placeholders});"
-                if self.db.execute(query, validated):
-                    self.populate_treeview(tree, table_name)
-                    dialog.destroy()
+                widget.delete(0, tk.END)
+                if value is not None:
+                    widget.insert(0, value)
 
-        ttk.Button(dialog, text="Подтвердить", command=on_submit).grid(row=len(columns), columnspan=2, pady=10)
+    def submit_row_form(self, form):
+        table_name, columns, tree = form["table_name"], form["columns"], form["tree"]
+        new_values = [w.get() for _, w in form["widgets"]]
+        validated = self.validate_and_transform(table_name, columns, new_values)
+        if validated is None:
+            return
+        if form["is_edit"]:
+            saved = self.db.update_row(table_name, columns, validated, form["current_values"])
+        else:
+            saved = self.db.insert_row(table_name, columns, validated)
+        if saved:
+            self.populate_treeview(tree, table_name)
+            form["dialog"].withdraw()
 
     def delete_row(self, tree, table_name):
         """Удаление выбранной записи с подтверждением."""
@@ -239,17 +3209,119 @@ class DatabaseApp:
         if not confirm:
             return
         values = tree.item(selected)['values']
-        columns = tree['columns']
-        where_clause = ' AND '.join([f"{col} = ?" for col in columns])
-        query = f"DELETE FROM '{table_name}' WHERE {where_clause};"
-        if self.db.execute(query, values):
+        if self.db.delete_row(table_name, tree['columns'], values):
             self.populate_treeview(tree, table_name)
 
+    def run_profile(self):
+        """Профилирование таблиц в фоновом потоке с сохранением в report_profile.json."""
+        if self.profiler is None:
+            self.profiler = TableProfiler(self.db.connection_params)
+        self.profile_button.state(["disabled"])
+
+        def worker():
+            try:
+                self.profile_events.put((self.profiler.export_json("report_profile.json"), None))
+            except (sqlite3.Error, OSError) as e:
+                self.profile_events.put((None, e))
+
+        threading.Thread(target=worker, daemon=True).start()
+        self.master.after(100, self.poll_profile_events)
+
+    def poll_profile_events(self):
+        try:
+            profile, error = self.profile_events.get_nowait()
+        except queue.Empty:
+            self.master.after(100, self.poll_profile_events)
+            return
+        self.profile_button.state(["!disabled"])
+        if error:
+            messagebox.showerror("Ошибка профилирования", str(error))
+            return
+        self.show_profile(profile)
+
+    def show_profile(self, profile):
+        """Окно с кратким профилем данных."""
+        window = tk.Toplevel(self.master)
+        window.title("Профиль данных")
+        text_widget = tk.Text(window, wrap='word', width=100, height=30, font=("Arial", 10))
+        text_widget.pack(expand=True, fill='both', padx=10, pady=10)
+        lines = []
+        for table, table_profile in profile.items():
+            lines.append(f"Таблица: {table} (записей: {table_profile['rows']})\n")
+            for col, stats in table_profile["columns"].items():
+                distinct = stats["distinct"] if stats["distinct_exact"] else f"~{stats['distinct']}"
+                top = ", ".join(f"{value} ({count})" for value, count in stats["top_values"])
+                lines.append(f"  {col}: NULL {stats['null_ratio']:.1%}, различных {distinct}, "
+                             f"min {stats['min']}, max {stats['max']}; частые: {top}\n")
+            lines.append("-" * 80 + "\n")
+        lines.append("Полный профиль сохранён в report_profile.json\n")
+        text_widget.insert("1.0", "".join(lines))
+        text_widget.config(state="disabled")
+
+    def create_export_controls(self, parent):
+        """Панель выгрузки всех таблиц (формат, сжатие, прогресс) для окна отчёта."""
+        export_frame = tk.Frame(parent, bg="#f0f0f0")
+        export_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=(0, 10))
+        fmt_box = ttk.Combobox(export_frame, state="readonly", values=EXPORT_FORMATS, width=8)
+        fmt_box.set("csv")
+        fmt_box.pack(side=tk.LEFT, padx=5)
+        compress_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(export_frame, text="gzip", variable=compress_var).pack(side=tk.LEFT, padx=5)
+        status = ttk.Label(export_frame, text="")
+        button = ttk.Button(export_frame, text="Экспорт таблиц",
+                            command=lambda: self.export_tables(fmt_box.get(), compress_var.get(), button, status))
+        button.pack(side=tk.LEFT, padx=5)
+        status.pack(side=tk.LEFT, padx=5)
+
+    def export_tables(self, fmt, compress, button, status, directory="export"):
+        """
+        Выгрузка всех таблиц в каталог directory в фоновом потоке.
+        Прогресс передаётся через очередь и отображается в status.
+        """
+        os.makedirs(directory, exist_ok=True)
+        events = queue.Queue()
+        button.state(["disabled"])
+
+        def worker():
+            try:
+                for table in self.table_names:
+                    path = os.path.join(directory, f"{table}.{fmt}" + (".gz" if compress else ""))
+                    self.db.export(path, table=table, fmt=fmt, compress=compress, workers=4,
+                                   progress=lambda done, total, table=table: events.put(("progress", table, done, total)))
+            except (sqlite3.Error, OSError, RuntimeError) as e:
+                events.put(("done", e))
+                return
+            events.put(("done", None))
+
+        def poll():
+            while True:
+                try:
+                    event = events.get_nowait()
+                except queue.Empty:
+                    break
+                if event[0] == "progress":
+                    _, table, done, total = event
+                    status.config(text=f"{table}: {done}/{total}")
+                else:
+                    button.state(["!disabled"])
+                    if event[1]:
+                        status.config(text="")
+                        messagebox.showerror("Ошибка экспорта", str(event[1]))
+                    else:
+                        status.config(text=f"Таблицы выгружены в каталог {directory}")
+                    return
+            self.master.after(100, poll)
+
+        threading.Thread(target=worker, daemon=True).start()
+        self.master.after(100, poll)
+
     def generate_report(self):
         """Формирование отчёта по базе данных и сохранение его в файл report.txt."""
         report_window = tk.Toplevel(self.master)
         report_window.title("Отчёт по базе данных")
         report_window.configure(bg="#f0f0f0")
+        if self.sqlite_tools:
+            self.create_export_controls(report_window)
         text_widget = tk.Text(report_window, wrap='word', width=100, height=30, font=("Arial", 10))
         text_widget.pack(expand=True, fill='both', padx=10, pady=10)
         scrollbar = tk.Scrollbar(report_window, command=text_widget.yview)
@@ -258,16 +3330,15 @@ class DatabaseApp:
 
         report_lines = []
         report_lines.append("Отчёт по базе данных\n")
-        report_lines.append(f"База данных: {self.db.connection_params.get('database')}\n")
+        report_lines.append(f"База данных: {self.db.location}\n")
         report_lines.append("=" * 80 + "\n\n")
         for table in self.table_names:
             report_lines.append(f"Таблица: {table}\n")
-            columns_info = self.db.fetchall(f"PRAGMA table_info('{table}');")
-            columns = [col[1] for col in columns_info]
+            columns = self.get_table_columns(table)
             report_lines.append("Столбцы: " + ", ".join(columns) + "\n")
-            count = self.db.fetchone(f"SELECT COUNT(*) FROM '{table}';")[0]
+            count = self.db.count_rows(table)
             report_lines.append(f"Количество записей: {count}\n")
-            sample_rows = self.db.fetchall(f"SELECT * FROM '{table}' LIMIT 5;")
+            sample_rows = self.db.fetchall(f'SELECT * FROM "{table}" LIMIT 5;')
             if sample_rows:
                 report_lines.append("Примеры записей:\n")
                 for row in sample_rows:
@@ -280,9 +3351,11 @@ class DatabaseApp:
         with open("report.txt", "w", encoding="utf-8") as f:
             f.write("".join(report_lines))
 
-if __name__ == "__main__":
-    connection_params = {"database": "military_draft.sqlite3"}
-    # Создаем таблицы, если они отсутствуют
+def init_schema(connection_params, cdc=False):
+    """
+    Создает таблицы, если они отсутствуют.
+    При cdc=True дополнительно устанавливает журнал изменений (см. install_cdc).
+    """
     conn = sqlite3.connect(**connection_params)
     cursor = conn.cursor()
 
@@ -339,11 +3412,190 @@ if __name__ == "__main__":
     ''')
 
     conn.commit()
+    if cdc:
+        install_cdc(conn)
     conn.close()
 
-    try:
-        root = tk.Tk()
-        app = DatabaseApp(root, connection_params)
-        root.mainloop()
-    except sqlite3.Error as err:
-        print(f"Error: {err}")
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Система управления военкоматом")
+    parser.add_argument("--database", default="military_draft.sqlite3", help="Файл базы данных")
+    parser.add_argument("--cdc", action="store_true", help="Включить журнал изменений (CDC)")
+    parser.add_argument("--memory-replica", action="store_true",
+                        help="Читать данные из копии базы в памяти")
+    parser.add_argument("--archive", nargs="?", const="", default=None,
+                        help="Подключить архив (по умолчанию <база>.archive.sqlite3)")
+    parser.add_argument("--shard-catalog", help="Каталог шардированной раскладки (для команды shard)")
+    parser.add_argument("--backend", help="Хранилище для интерфейса: sqlite:///путь, standin:///путь, "
+                                          "shard:///каталог или postgresql://... (по умолчанию файл --database)")
+    parser.add_argument("--pool-size", type=int, default=5, help="Размер пула соединений клиент-серверного хранилища")
+    parser.add_argument("--replica-limit-mb", type=int, default=256,
+                        help="Максимальный размер базы для копии в памяти, МБ")
+    subparsers = parser.add_subparsers(dest="command")
+    replicate_parser = subparsers.add_parser("replicate", help="Применить журнал изменений к вторичной базе")
+    replicate_parser.add_argument("replica", help="Файл вторичной базы данных")
+    replicate_parser.add_argument("--batch-size", type=int, default=500)
+    replicate_parser.add_argument("--no-compact", action="store_true", help="Не очищать применённую часть журнала")
+    backup_parser = subparsers.add_parser("backup", help="Онлайн-резервное копирование")
+    backup_parser.add_argument("--dir", default="backups", help="Каталог для снимков")
+    backup_parser.add_argument("--keep", type=int, default=5, help="Сколько снимков хранить")
+    backup_parser.add_argument("--pages", type=int, default=64, help="Страниц за один шаг копирования")
+    backup_parser.add_argument("--interval", type=int, default=0,
+                               help="Интервал в секундах для периодического копирования (0 — однократно)")
+    profile_parser = subparsers.add_parser("profile", help="Профилирование таблиц в JSON")
+    profile_parser.add_argument("--output", default="report_profile.json")
+    profile_parser.add_argument("--workers", type=int, default=4)
+    profile_parser.add_argument("--chunk-size", type=int, default=5000)
+    export_parser = subparsers.add_parser("export", help="Потоковая выгрузка таблицы или запроса")
+    export_source = export_parser.add_mutually_exclusive_group(required=True)
+    export_source.add_argument("--table")
+    export_source.add_argument("--query")
+    export_parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    export_parser.add_argument("--gzip", action="store_true")
+    export_parser.add_argument("--chunk-size", type=int, default=1000)
+    export_parser.add_argument("--workers", type=int, default=1)
+    export_parser.add_argument("output")
+    dedup_parser = subparsers.add_parser("dedup", help="Поиск дубликатов граждан")
+    dedup_parser.add_argument("--threshold", type=float, default=0.85)
+    dedup_parser.add_argument("--workers", type=int, default=4)
+    shard_parser = subparsers.add_parser("shard", help="Шардирование реестра граждан")
+    shard_parser.add_argument("action", choices=["create", "rebalance", "add", "find", "search", "count"])
+    shard_parser.add_argument("value", nargs="?", help="id гражданина, текст поиска или имя таблицы")
+    shard_parser.add_argument("--shards", type=int, default=4, help="Число шардов при создании")
+    shard_parser.add_argument("--partitions", type=int, default=64, help="Число партиций при создании")
+    archive_parser = subparsers.add_parser("archive", help="Перенос устаревших строк в архив")
+    archive_parser.add_argument("--batch-size", type=int, default=1000)
+    deadlines_parser = subparsers.add_parser("deadlines", help="Истекающие отсрочки и приближающиеся даты призыва")
+    deadlines_parser.add_argument("--days", type=int, default=DUE_LOOKAHEAD_DAYS, help="Горизонт в днях")
+    deadlines_parser.add_argument("--watch", type=int, default=0, help="Проверять каждые N секунд")
+    conformance_parser = subparsers.add_parser("conformance",
+                                               help="Проверка совместимости и производительности хранилищ")
+    conformance_parser.add_argument("urls", nargs="*",
+                                    help="Адреса хранилищ (по умолчанию временные sqlite:// и standin://)")
+    conformance_parser.add_argument("--rows", type=int, default=10000)
+    conformance_parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    connection_params = {"database": args.database}
+    archive_path = (args.archive or default_archive_path(connection_params)) if args.archive is not None else None
+    # Создаем таблицы, если они отсутствуют
+    init_schema(connection_params, cdc=args.cdc or args.command == "replicate")
+
+    if args.command == "replicate":
+        replicator = ChangeReplicator(connection_params, args.replica, batch_size=args.batch_size)
+        applied = replicator.sync()
+        if not args.no_compact:
+            replicator.compact()
+        print(f"Применено изменений: {applied}, последний номер: {replicator.last_seq()}")
+        replicator.close()
+    elif args.command == "backup":
+        manager = BackupManager(connection_params, backup_dir=args.dir, keep=args.keep, pages=args.pages)
+
+        def print_progress(copied, total):
+            print(f"\rКопирование: {copied}/{total} стр.", end="", flush=True)
+
+        def print_done(path, error):
+            print()
+            print(f"Ошибка: {error}" if error else f"Снимок сохранён: {path}")
+
+        if args.interval > 0:
+            manager.start_scheduler(args.interval, progress=print_progress, done=print_done)
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                manager.stop_scheduler()
+        else:
+            manager.start_backup(progress=print_progress, done=print_done).join()
+    elif args.command == "profile":
+        profiler = TableProfiler(connection_params, workers=args.workers, chunk_size=args.chunk_size)
+        profile = profiler.export_json(args.output)
+        profiler.close()
+        print(f"Профиль {len(profile)} таблиц сохранён в {args.output}")
+    elif args.command == "export":
+        db = DatabaseManager(connection_params)
+
+        def print_progress(done, total):
+            print(f"\rВыгружено строк: {done}" + (f"/{total}" if total is not None else ""), end="", flush=True)
+
+        exported = db.export(args.output, table=args.table, query=args.query, fmt=args.format,
+                             compress=args.gzip, chunk_size=args.chunk_size, workers=args.workers,
+                             progress=print_progress)
+        db.close()
+        print(f"\nВыгрузка завершена: {exported} строк в {args.output}")
+    elif args.command == "dedup":
+        deduplicator = CitizenDeduplicator(connection_params, threshold=args.threshold, workers=args.workers,
+                                           archive_path=archive_path)
+        for left, left_name, right, right_name, score in deduplicator.find_duplicates():
+            print(f"{left}\t{left_name}\t{right}\t{right_name}\t{score}")
+    elif args.command == "shard":
+        catalog_path = args.shard_catalog or os.path.splitext(args.database)[0] + ".catalog.sqlite3"
+        if args.action == "create":
+            shards = ShardedDatabase.create(connection_params, catalog_path, args.shards, args.partitions)
+            print(f"Создано шардов: {len(shards.shard_paths)}, каталог: {catalog_path}")
+        else:
+            shards = ShardedDatabase(catalog_path)
+            if args.action == "add":
+                print(f"Добавлен шард {shards.add_shard()}")
+                args.action = "rebalance"
+            if args.action == "rebalance":
+                for partition, shard in shards.rebalance():
+                    print(f"Партиция {partition} -> шард {shard}")
+            elif args.action == "find":
+                print(shards.get_citizen(int(args.value)))
+            elif args.action == "search":
+                for row in shards.search_citizens(args.value):
+                    print(" | ".join(str(item) for item in row))
+            elif args.action == "count":
+                print(shards.count(args.value or CITIZEN_TABLE))
+        shards.close()
+    elif args.command == "archive":
+        archiver = Archiver(connection_params, archive_path=archive_path, batch_size=args.batch_size)
+        for table, moved in archiver.archive().items():
+            print(f"{table}: перенесено в архив {moved} строк")
+        archiver.close()
+    elif args.command == "deadlines":
+        scheduler = DeadlineScheduler(connection_params, lookahead_days=args.days)
+
+        def print_deadlines(items):
+            for table, row_id, due_date, citizen_id, fio in items:
+                print(f"{due_date}\t{table}\t{row_id}\t{citizen_id or ''}\t{fio or ''}")
+
+        if args.watch > 0:
+            scheduler.start(print_deadlines, interval=args.watch)
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                scheduler.stop()
+        else:
+            print_deadlines(scheduler.poll())
+    elif args.command == "conformance":
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp:
+            urls = args.urls or [f"sqlite:///{os.path.join(tmp, 'reference.sqlite3')}",
+                                 f"standin:///{os.path.join(tmp, 'standin.sqlite3')}"]
+            failed = False
+            for url in urls:
+                backend = open_backend(url, pool_size=args.pool_size)
+                print(f"{url.rpartition('@')[2]} ({type(backend).__name__}, {backend.dialect})")
+                try:
+                    for name, ok, elapsed, detail in run_conformance(backend, rows=args.rows,
+                                                                     batch_size=args.batch_size):
+                        failed = failed or not ok
+                        print(f"  {'OK  ' if ok else 'FAIL'} {name:<22} {elapsed * 1000:9.1f} мс  {detail}")
+                finally:
+                    backend.close()
+        raise SystemExit(1 if failed else 0)
+    else:
+        try:
+            root = tk.Tk()
+            db_options = {"memory_replica": args.memory_replica, "replica_limit_mb": args.replica_limit_mb,
+                          "archive_path": archive_path}
+            backend = open_backend(args.backend, pool_size=args.pool_size, **db_options) if args.backend else None
+            app = DatabaseApp(root, connection_params, backend=backend, **db_options)
+            root.mainloop()
+        except (sqlite3.Error, RuntimeError, ValueError) as err:
+            print(f"Error: {err}")
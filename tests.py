@@ -0,0 +1,87 @@
+# catalog/tests.py
+from datetime import date
+
+from django.db import connection
+from django.test import TestCase
+
+from .models import PriceCache, benchmark_ingest, price_cache, ДневныеПродажи, Продавцы, Товары, Чеки
+
+class СводкаПродажTests(TestCase):
+    def setUp(self):
+        self.product = Товары.objects.create(наименование="Товар", единица_измерения="шт", цена=10)
+        self.other = Товары.objects.create(наименование="Другой", единица_измерения="шт", цена=20)
+        self.day = date(2024, 1, 10)
+        self.sales = Продавцы.objects.bulk_ingest(
+            {"товар": self.product.pk, "количество": 2, "дата_покупки": self.day,
+             "номер_кассы": 1, "продавец": "А"} for _ in range(3))
+
+    def rollup_rows(self):
+        return list(ДневныеПродажи.objects.order_by("продавец", "номер_кассы", "товар_id")
+                    .values_list("продавец", "номер_кассы", "товар_id", "количество", "выручка", "число_чеков"))
+
+    def assertRollupMatchesLive(self):
+        """Сводка после изменений совпадает с пересчитанной по исходным данным."""
+        stored = self.rollup_rows()
+        ДневныеПродажи.objects.rebuild(self.day, self.day)
+        self.assertEqual(stored, self.rollup_rows())
+
+    def test_update_sellers(self):
+        Продавцы.objects.filter(pk=self.sales[0].pk).update(продавец="Б", номер_кассы=2)
+        self.assertRollupMatchesLive()
+
+    def test_update_by_changed_field(self):
+        # Фильтр по изменяемому полю: после UPDATE строки ему уже не соответствуют
+        Продавцы.objects.filter(продавец="А").update(продавец="Б")
+        self.assertRollupMatchesLive()
+
+    def test_update_receipts(self):
+        Чеки.objects.filter(pk=self.sales[0].номер_чека_id).update(товар=self.other, количество=5, стоимость=100)
+        self.assertRollupMatchesLive()
+
+    def test_bulk_update(self):
+        for sale in self.sales:
+            sale.продавец = "В"
+        Продавцы.objects.bulk_update(self.sales[:2], ["продавец"])
+        receipt = self.sales[2].номер_чека
+        receipt.количество = 7
+        Чеки.objects.bulk_update([receipt], ["количество"])
+        self.assertRollupMatchesLive()
+
+    def test_delete_product_removes_rollup(self):
+        self.product.delete()
+        self.assertFalse(ДневныеПродажи.objects.filter(товар_id=self.product.pk).exists())
+        self.assertFalse(ДневныеПродажи.objects.exists())
+
+class PriceCacheTests(TestCase):
+    def setUp(self):
+        self.cache = PriceCache()
+        self.product = Товары.objects.create(наименование="Товар", единица_измерения="шт", цена=10)
+
+    def test_invalidate_all_during_read(self):
+        # Полный сброс между чтением цены и записью в кэш: товара в кэше ещё не было
+        def invalidate_during_query(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            self.cache.invalidate()
+            return result
+        with self.captureOnCommitCallbacks(execute=True):
+            with connection.execute_wrapper(invalidate_during_query):
+                self.assertEqual(self.cache.get(self.product.pk), 10)
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+    def test_store_after_commit_only(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.cache.get(self.product.pk)
+        self.assertEqual(self.cache.stats()["size"], 0)
+        # Транзакция откатилась — отложенная запись не выполняется; после фиксации цена в кэше
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cache.get(self.product.pk)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.cache.stats()["size"], 1)
+
+    def test_benchmark_ingest_leaves_no_prices(self):
+        price_cache.invalidate()
+        with self.captureOnCommitCallbacks(execute=True):
+            results = benchmark_ingest(count=20, products=3)
+        self.assertEqual(set(results), {"save", "bulk_ingest", "delete_product"})
+        self.assertEqual(price_cache.stats()["size"], 0)
+        self.assertEqual(Товары.objects.count(), 1)
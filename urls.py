@@ -0,0 +1,9 @@
+# catalog/urls.py
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path("sales/", views.sales_list, name="sales_list"),
+    path("sales/export/", views.sales_export, name="sales_export"),
+]
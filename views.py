@@ -0,0 +1,82 @@
+# catalog/views.py
+import csv
+import json
+from datetime import date
+
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .models import Продавцы
+
+EXPORT_COLUMNS = ["id", "дата_покупки", "номер_кассы", "продавец", "номер_чека", "товар", "количество", "стоимость"]
+
+def _int_param(request, name, default=None):
+    value = request.GET.get(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Параметр {name} должен быть целым числом: {value}")
+
+def _date_param(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Параметр {name} должен быть датой ГГГГ-ММ-ДД: {value}")
+
+def _filters(request):
+    """Фильтры продаж из параметров запроса; неверное значение — ValueError."""
+    return {
+        "продавец": request.GET.get("продавец") or None,
+        "номер_кассы": _int_param(request, "номер_кассы"),
+        "дата_с": _date_param(request, "дата_с"),
+        "дата_по": _date_param(request, "дата_по"),
+    }
+
+def _bad_request(error):
+    return JsonResponse({"error": str(error)}, status=400, json_dumps_params={"ensure_ascii": False})
+
+def sales_list(request):
+    """Список продаж постранично: ?cursor=<next_cursor>&limit=50 и фильтры. Неверные параметры — 400."""
+    try:
+        limit = _int_param(request, "limit", 50)
+        if limit < 1:
+            raise ValueError(f"Параметр limit должен быть положительным: {limit}")
+        sales, next_cursor = Продавцы.objects.page(cursor=request.GET.get("cursor"), limit=min(limit, 500),
+                                                   **_filters(request))
+    except ValueError as e:
+        return _bad_request(e)
+    return JsonResponse({"results": [sale.as_dict() for sale in sales], "next_cursor": next_cursor},
+                        json_dumps_params={"ensure_ascii": False})
+
+class _Echo:
+    """Объект с методом write для csv.writer: строка возвращается, а не записывается."""
+    def write(self, value):
+        return value
+
+def sales_export(request):
+    """Потоковая выгрузка продаж в CSV или JSONL (?format=jsonl) с постоянным расходом памяти."""
+    try:
+        filters = _filters(request)
+    except ValueError as e:
+        return _bad_request(e)
+    rows = Продавцы.objects.export_rows(**filters)
+    if request.GET.get("format") == "jsonl":
+        content = (json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+        response = StreamingHttpResponse(content, content_type="application/x-ndjson; charset=utf-8")
+        filename = "sales.jsonl"
+    else:
+        writer = csv.DictWriter(_Echo(), fieldnames=EXPORT_COLUMNS)
+        content = (writer.writerow(row) for row in rows)
+        header = writer.writerow(dict(zip(EXPORT_COLUMNS, EXPORT_COLUMNS)))
+        response = StreamingHttpResponse(_prepend(header, content), content_type="text/csv; charset=utf-8")
+        filename = "sales.csv"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+def _prepend(first, rest):
+    yield first
+    yield from rest